@@ -0,0 +1,226 @@
+"""
+Streaming export of converted schedules as one complete AIXM 5.1.1 message.
+
+Conversions return bare <aixm:timeInterval> fragments. export_chunks() takes
+(service id, fragment) pairs from any iterable and wraps each service in a
+namespaced feature (AirTrafficControlService by default, availability in a
+ServiceOperationalStatus, which is a PropertiesWithSchedule) inside an
+AIXMBasicMessage. The document is produced with an incremental writer and yielded
+in chunks, optionally gzip-compressed on the fly, so memory use depends on the
+largest single service, not on how many there are. Fragments that aren't
+well-formed are skipped and counted rather than breaking the document. A service
+id that repeats gets a suffixed identifier ("<id>#2", ...), so gml:ids stay unique.
+
+From a bulk conversion results file, run from the repository root:
+    python -m backend.aixm_export results.jsonl aixm.xml.gz
+"""
+import argparse
+import datetime
+import json
+import logging
+import uuid
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from .aixm_xml import AIXM_NAMESPACE, parse_fragment
+from .streaming import split_time_intervals
+
+logger = logging.getLogger(__name__)
+
+NAMESPACES = {
+    "message": "http://www.aixm.aero/schema/5.1.1/message",
+    "aixm": AIXM_NAMESPACE,
+    "gml": "http://www.opengis.net/gml/3.2",
+    "xlink": "http://www.w3.org/1999/xlink",
+    "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+}
+SCHEMA_LOCATION = "http://www.aixm.aero/schema/5.1.1/message http://www.aixm.aero/schema/5.1.1/message/AIXM_BasicMessage.xsd"
+# Feature identifiers are name-based UUIDs, so re-exports of a service keep the same identifier
+SERVICE_ID_NAMESPACE = uuid.UUID("5b0c1a5e-9d1f-4b53-8f57-3e1b9a0c7d21")
+CHUNK_SIZE = 64 * 1024
+
+
+class XmlStreamWriter:
+    """Minimal incremental XML writer: buffers indented output until drain()."""
+
+    def __init__(self, indent: str = "  "):
+        self._parts: List[str] = []
+        self._size = 0
+        self._open: List[str] = []
+        self._indent = indent
+
+    def _write(self, text: str):
+        self._parts.append(text)
+        self._size += len(text)
+
+    def _pad(self) -> str:
+        return self._indent * len(self._open)
+
+    def start(self, tag: str, attributes: Optional[Dict[str, str]] = None):
+        attrs = "".join(f" {name}={quoteattr(value)}" for name, value in (attributes or {}).items())
+        self._write(f"{self._pad()}<{tag}{attrs}>\n")
+        self._open.append(tag)
+
+    def end(self):
+        tag = self._open.pop()
+        self._write(f"{self._pad()}</{tag}>\n")
+
+    def element(self, tag: str, text: Optional[str] = None, attributes: Optional[Dict[str, str]] = None):
+        attrs = "".join(f" {name}={quoteattr(value)}" for name, value in (attributes or {}).items())
+        if text is None:
+            self._write(f"{self._pad()}<{tag}{attrs}/>\n")
+        else:
+            self._write(f"{self._pad()}<{tag}{attrs}>{escape(text)}</{tag}>\n")
+
+    def raw(self, xml: str):
+        """Writes an already serialized element, re-indented to the current depth."""
+        pad = self._pad()
+        self._write("".join(f"{pad}{line}\n" for line in xml.strip().splitlines()))
+
+    @property
+    def buffered(self) -> int:
+        return self._size
+
+    def drain(self) -> bytes:
+        data = "".join(self._parts).encode("utf-8")
+        self._parts.clear()
+        self._size = 0
+        return data
+
+
+class AixmExporter:
+    def __init__(
+        self,
+        feature: str = "AirTrafficControlService",
+        valid_from: Optional[datetime.datetime] = None,
+        message_id: Optional[str] = None,
+    ):
+        self.feature = feature
+        self.valid_from = valid_from or datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.message_id = message_id or f"msg.{uuid.uuid4()}"
+        self.services = 0
+        self.intervals = 0
+        self.skipped = 0
+        self.duplicates = 0
+
+    def _valid_intervals(self, service_id: str, aixm_xml: str) -> List[str]:
+        intervals = []
+        for interval in split_time_intervals(aixm_xml or ""):
+            try:
+                parse_fragment(interval)
+            except ElementTree.ParseError as parse_error:
+                logger.warning(f"Skipping malformed timeInterval of {service_id}: {parse_error}")
+                self.skipped += 1
+                continue
+            intervals.append(interval)
+        return intervals
+
+    def _identifier(self, service_id: str, used: Set[str]) -> str:
+        identifier = str(uuid.uuid5(SERVICE_ID_NAMESPACE, service_id))
+        occurrence = 1
+        while identifier in used:
+            occurrence += 1
+            identifier = str(uuid.uuid5(SERVICE_ID_NAMESPACE, f"{service_id}#{occurrence}"))
+        if occurrence > 1:
+            logger.warning(f"Service id {service_id!r} is repeated; exporting occurrence {occurrence} as {service_id}#{occurrence}")
+            self.duplicates += 1
+        used.add(identifier)
+        return identifier
+
+    def _write_service(self, writer: XmlStreamWriter, service_id: str, identifier: str, intervals: List[str]):
+        writer.start("message:hasMember")
+        writer.start(f"aixm:{self.feature}", {"gml:id": f"uuid.{identifier}"})
+        writer.element("gml:identifier", identifier, {"codeSpace": "urn:uuid:"})
+        writer.start("aixm:timeSlice")
+        writer.start(f"aixm:{self.feature}TimeSlice", {"gml:id": f"ts.{identifier}"})
+        writer.start("gml:validTime")
+        writer.start("gml:TimePeriod", {"gml:id": f"vt.{identifier}"})
+        writer.element("gml:beginPosition", self.valid_from.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        writer.element("gml:endPosition", attributes={"indeterminatePosition": "unknown"})
+        writer.end()
+        writer.end()
+        writer.element("aixm:interpretation", "BASELINE")
+        writer.element("aixm:sequenceNumber", "1")
+        writer.element("aixm:correctionNumber", "0")
+        writer.element("aixm:name", service_id)
+        writer.start("aixm:availability")
+        writer.start("aixm:ServiceOperationalStatus", {"gml:id": f"os.{identifier}"})
+        for interval in intervals:
+            writer.raw(interval)
+        writer.element("aixm:operationalStatus", "NORMAL")
+        writer.end()
+        writer.end()
+        writer.end()
+        writer.end()
+        writer.end()
+        writer.end()
+
+    def iter_xml(self, records: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+        """Yields the uncompressed document in chunks of about CHUNK_SIZE bytes."""
+        writer = XmlStreamWriter()
+        writer.raw('<?xml version="1.0" encoding="UTF-8"?>')
+        root_attributes = {f"xmlns:{prefix}": uri for prefix, uri in NAMESPACES.items()}
+        root_attributes.update({"xsi:schemaLocation": SCHEMA_LOCATION, "gml:id": self.message_id})
+        writer.start("message:AIXMBasicMessage", root_attributes)
+        used: Set[str] = set()
+        for service_id, aixm_xml in records:
+            intervals = self._valid_intervals(service_id, aixm_xml)
+            if not intervals:
+                continue
+            self._write_service(writer, service_id, self._identifier(service_id, used), intervals)
+            self.services += 1
+            self.intervals += len(intervals)
+            if writer.buffered >= CHUNK_SIZE:
+                yield writer.drain()
+        writer.end()
+        yield writer.drain()
+        logger.info(
+            f"Exported {self.services} services, {self.intervals} timeIntervals "
+            f"({self.skipped} malformed skipped, {self.duplicates} repeated ids suffixed)"
+        )
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compresses a byte stream into gzip format as it goes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(records: Iterable[Tuple[str, str]], gzip: bool = False, exporter: Optional[AixmExporter] = None) -> Iterator[bytes]:
+    chunks = (exporter or AixmExporter()).iter_xml(records)
+    return gzip_chunks(chunks) if gzip else chunks
+
+
+def read_results(path: str) -> Iterator[Tuple[str, str]]:
+    """(id, aixm_xml) pairs from a bulk_convert JSONL output, skipping failed rows."""
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if row.get("aixm_xml") and not row.get("error"):
+                yield str(row["id"]), row["aixm_xml"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("results", help="JSONL written by backend.bulk_convert")
+    parser.add_argument("output", help="AIXM message to write; gzip-compressed if it ends in .gz")
+    parser.add_argument("--feature", default="AirTrafficControlService", help="AIXM service feature type")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    exporter = AixmExporter(feature=args.feature)
+    with open(args.output, "wb") as output:
+        for chunk in export_chunks(read_results(args.results), gzip=args.output.endswith(".gz"), exporter=exporter):
+            output.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
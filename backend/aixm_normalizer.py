@@ -0,0 +1,169 @@
+"""
+Post-processing for model-generated AIXM fragments.
+
+normalize_aixm_output() makes one compiled regex pass that strips code fences, XML
+declarations, wrapper elements and namespace declarations while normalizing
+HHMM -> HH:MM and DDMM -> DD-MM. It then parses the result once and checks it
+against the Timesheet element order. Problems that can be fixed locally (children
+out of order, missing timeReference/default dates, several Timesheets in one
+timeInterval, a bare Timesheet) are repaired and the fragment is re-rendered.
+Anything else raises NormalizationError so the caller can retry.
+"""
+import logging
+import re
+from typing import List
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from .aixm_xml import AIXM_NAMESPACE, DEFAULT_END_DATE, DEFAULT_START_DATE, parse_fragment
+
+logger = logging.getLogger(__name__)
+
+# AIXM 5.1.1 Timesheet content model, in sequence order
+TIMESHEET_SCHEMA = (
+    "timeReference", "startDate", "endDate", "day", "dayTil",
+    "startTime", "startEvent", "startTimeRelativeEvent", "startEventInterpretation",
+    "endTime", "endEvent", "endTimeRelativeEvent", "endEventInterpretation",
+    "daylightSavingAdjust", "excluded", "annotation",
+)
+SCHEMA_POSITION = {name: index for index, name in enumerate(TIMESHEET_SCHEMA)}
+REPEATABLE = {"annotation"}
+
+CLEANUP_RE = re.compile(
+    r"(?P<strip>```(?:xml)?|<\?xml[^>]*\?>|</?aixm:PropertiesWithSchedule[^>]*>|</?Schedules[^>]*>"
+    r"|\s+xmlns(?::\w+)?=\"[^\"]*\")"
+    r"|<aixm:(?P<time_tag>startTime|endTime)>\s*(?P<hours>\d{2}):?(?P<minutes>\d{2})\s*</aixm:(?P=time_tag)>"
+    r"|<aixm:(?P<date_tag>startDate|endDate)>\s*(?P<day>\d{2})[-/.]?(?P<month>\d{2})\s*</aixm:(?P=date_tag)>"
+)
+TIME_VALUE_RE = re.compile(r"^(\d{2}):(\d{2})$")
+DATE_VALUE_RE = re.compile(r"^(\d{2})-(\d{2})$")
+
+
+class NormalizationError(ValueError):
+    """Model output that can't be repaired locally."""
+
+
+def _cleanup(match: "re.Match[str]") -> str:
+    if match.group("time_tag"):
+        tag = match.group("time_tag")
+        return f"<aixm:{tag}>{match.group('hours')}:{match.group('minutes')}</aixm:{tag}>"
+    if match.group("date_tag"):
+        tag = match.group("date_tag")
+        return f"<aixm:{tag}>{match.group('day')}-{match.group('month')}</aixm:{tag}>"
+    return ""
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _aixm(name: str) -> str:
+    return f"{{{AIXM_NAMESPACE}}}{name}"
+
+
+def _check_values(sheet: ElementTree.Element):
+    for name in ("startTime", "endTime"):
+        element = sheet.find(_aixm(name))
+        if element is not None:
+            match = TIME_VALUE_RE.match((element.text or "").strip())
+            hours, minutes = (int(match.group(1)), int(match.group(2))) if match else (99, 99)
+            if hours > 24 or minutes > 59 or (hours == 24 and minutes):
+                raise NormalizationError(f"Invalid {name} {element.text!r}")
+    for name in ("startDate", "endDate"):
+        element = sheet.find(_aixm(name))
+        match = DATE_VALUE_RE.match((element.text or "").strip()) if element is not None else None
+        if element is not None and (not match or not 1 <= int(match.group(1)) <= 31 or not 1 <= int(match.group(2)) <= 12):
+            raise NormalizationError(f"Invalid {name} {element.text!r}")
+    if (sheet.find(_aixm("startTime")) is None) != (sheet.find(_aixm("endTime")) is None):
+        raise NormalizationError("startTime and endTime must appear together")
+
+
+def _repair_timesheet(sheet: ElementTree.Element) -> bool:
+    """Validates one Timesheet in place; returns True if anything had to be changed."""
+    children = list(sheet)
+    names = [_local(child.tag) for child in children]
+    unknown = [name for name in names if name not in SCHEMA_POSITION]
+    if unknown:
+        raise NormalizationError(f"Unknown Timesheet elements: {', '.join(unknown)}")
+    repeated = {name for name in names if names.count(name) > 1 and name not in REPEATABLE}
+    if repeated:
+        raise NormalizationError(f"Repeated Timesheet elements: {', '.join(sorted(repeated))}")
+
+    repaired = False
+    for name, value in (("timeReference", "UTC"), ("startDate", DEFAULT_START_DATE), ("endDate", DEFAULT_END_DATE)):
+        if name not in names:
+            element = ElementTree.Element(_aixm(name))
+            element.text = value
+            children.append(element)
+            repaired = True
+
+    ordered = sorted(children, key=lambda child: SCHEMA_POSITION[_local(child.tag)])
+    if ordered != list(sheet) or repaired:
+        for child in list(sheet):
+            sheet.remove(child)
+        sheet.extend(ordered)
+        repaired = True
+    _check_values(sheet)
+    return repaired
+
+
+def _render(element: ElementTree.Element, depth: int = 0) -> List[str]:
+    name = _local(element.tag)
+    if element.tag.startswith(f"{{{AIXM_NAMESPACE}}}"):
+        name = f"aixm:{name}"
+    attributes = "".join(f" {_local(key)}={quoteattr(value)}" for key, value in element.attrib.items())
+    indent = "  " * depth
+    children = list(element)
+    if not children:
+        return [f"{indent}<{name}{attributes}>{escape((element.text or '').strip())}</{name}>"]
+    lines = [f"{indent}<{name}{attributes}>"]
+    for child in children:
+        lines.extend(_render(child, depth + 1))
+    lines.append(f"{indent}</{name}>")
+    return lines
+
+
+def normalize_aixm_output(raw_text: str) -> str:
+    """Cleans, validates and if necessary repairs model output; raises NormalizationError."""
+    aixm_xml = CLEANUP_RE.sub(_cleanup, raw_text).strip()
+    try:
+        root = parse_fragment(aixm_xml)
+    except ElementTree.ParseError as parse_error:
+        raise NormalizationError(f"Output is not well-formed XML: {parse_error}") from parse_error
+
+    intervals: List[ElementTree.Element] = []
+    # Stray prose around the elements ("Here is the XML:") is dropped by re-rendering
+    repaired = bool((root.text or "").strip()) or any((child.tail or "").strip() for child in root)
+    for child in root:
+        name = _local(child.tag)
+        if name == "Timesheet":
+            # Bare Timesheet: wrap it
+            interval = ElementTree.Element(_aixm("timeInterval"))
+            interval.append(child)
+            intervals.append(interval)
+            repaired = True
+        elif name == "timeInterval":
+            sheets = list(child)
+            if not sheets or any(_local(sheet.tag) != "Timesheet" for sheet in sheets):
+                raise NormalizationError("Each timeInterval must contain a Timesheet")
+            if len(sheets) > 1:
+                # Several Timesheets in one interval: one interval each
+                for sheet in sheets:
+                    interval = ElementTree.Element(_aixm("timeInterval"))
+                    interval.append(sheet)
+                    intervals.append(interval)
+                repaired = True
+            else:
+                intervals.append(child)
+        else:
+            raise NormalizationError(f"Unexpected top-level element <{name}>")
+    if not intervals:
+        raise NormalizationError("Output contains no timeInterval elements")
+
+    for interval in intervals:
+        repaired = _repair_timesheet(interval[0]) or repaired
+
+    if not repaired:
+        return aixm_xml
+    logger.info("Repaired model output locally (element order / missing defaults / wrappers).")
+    return "\n".join(line for interval in intervals for line in _render(interval))
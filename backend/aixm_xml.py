@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import List, Optional
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+AIXM_NAMESPACE = "http://www.aixm.aero/schema/5.1.1"
+DEFAULT_START_DATE = "01-01"
+DEFAULT_END_DATE = "31-12"
+
+
+@dataclass
+class Timesheet:
+    """One <aixm:Timesheet>, in the element order the prompt asks the model for."""
+    start_date: str = DEFAULT_START_DATE
+    end_date: str = DEFAULT_END_DATE
+    day: Optional[str] = None
+    day_til: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    excluded: bool = False
+    note: Optional[str] = None
+
+
+def render_timesheet(sheet: Timesheet) -> str:
+    """Serializes a single timesheet as an <aixm:timeInterval> block (2-space indent)."""
+    lines = [
+        "<aixm:timeInterval>",
+        "  <aixm:Timesheet>",
+        "    <aixm:timeReference>UTC</aixm:timeReference>",
+        f"    <aixm:startDate>{sheet.start_date}</aixm:startDate>",
+        f"    <aixm:endDate>{sheet.end_date}</aixm:endDate>",
+    ]
+    if sheet.day:
+        lines.append(f"    <aixm:day>{sheet.day}</aixm:day>")
+    if sheet.day_til:
+        lines.append(f"    <aixm:dayTil>{sheet.day_til}</aixm:dayTil>")
+    if sheet.start_time:
+        lines.append(f"    <aixm:startTime>{sheet.start_time}</aixm:startTime>")
+    if sheet.end_time:
+        lines.append(f"    <aixm:endTime>{sheet.end_time}</aixm:endTime>")
+    if sheet.excluded:
+        lines.append("    <aixm:excluded>YES</aixm:excluded>")
+    if sheet.note:
+        lines.append("    <aixm:annotation>")
+        lines.append(f"      <aixm:Note>{escape(sheet.note)}</aixm:Note>")
+        lines.append("    </aixm:annotation>")
+    lines.append("  </aixm:Timesheet>")
+    lines.append("</aixm:timeInterval>")
+    return "\n".join(lines)
+
+
+def render_time_intervals(sheets: List[Timesheet]) -> str:
+    """Serializes timesheets the same way convert_schedule returns model output."""
+    return "\n".join(render_timesheet(sheet) for sheet in sheets)
+
+
+def parse_fragment(aixm_xml: str) -> ElementTree.Element:
+    """
+    Parses bare <aixm:timeInterval> fragments (no namespace declarations) under a
+    synthetic root. Raises ElementTree.ParseError if they aren't well-formed.
+    """
+    return ElementTree.fromstring(f'<root xmlns:aixm="{AIXM_NAMESPACE}">{aixm_xml}</root>')
+
+
+TIMESHEET_FIELDS = {
+    "startDate": "start_date",
+    "endDate": "end_date",
+    "day": "day",
+    "dayTil": "day_til",
+    "startTime": "start_time",
+    "endTime": "end_time",
+}
+
+
+def read_timesheets(aixm_xml: str) -> List[Timesheet]:
+    """
+    Parses <aixm:timeInterval> fragments back into Timesheets. Raises ValueError for
+    content the dataclass can't represent (events, several notes, non-UTC, ...).
+    """
+    ns = f"{{{AIXM_NAMESPACE}}}"
+    try:
+        root = parse_fragment(aixm_xml)
+    except ElementTree.ParseError as parse_error:
+        raise ValueError(f"Not well-formed: {parse_error}") from parse_error
+    sheets = []
+    for interval in root:
+        timesheets = interval.findall(f"{ns}Timesheet")
+        if interval.tag != f"{ns}timeInterval" or len(timesheets) != 1:
+            raise ValueError("Expected one Timesheet per timeInterval")
+        sheet = Timesheet()
+        for child in timesheets[0]:
+            name = child.tag[len(ns):] if child.tag.startswith(ns) else child.tag
+            value = (child.text or "").strip()
+            if name in TIMESHEET_FIELDS:
+                setattr(sheet, TIMESHEET_FIELDS[name], value)
+            elif name == "timeReference":
+                if value != "UTC":
+                    raise ValueError(f"Unsupported timeReference {value!r}")
+            elif name == "excluded":
+                sheet.excluded = value.upper() == "YES"
+            elif name == "annotation" and sheet.note is None:
+                notes = child.findall(f"{ns}Note")
+                if len(notes) != 1 or len(child) != 1:
+                    raise ValueError("Expected a single Note per annotation")
+                sheet.note = (notes[0].text or "").strip()
+            else:
+                raise ValueError(f"Unsupported Timesheet element {name}")
+        sheets.append(sheet)
+    return sheets
@@ -1,25 +1,66 @@
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
 import json
 import re
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 import logging
-from dotenv import load_dotenv
-import httpx
-import google.generativeai as genai
 import time 
+import asyncio
+import datetime
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
-from .architecture_doc_generator import ArchitectureDocGenerator
+from .compression import CompressionMiddleware
+from .document_cache import CachedDocument, is_not_modified, source_fingerprint
+from .model_clients import ModelClients
+from .singleflight import SingleFlight
+from .jobs import JobStore, JobWorker
+from .quota import Priority, QuotaExhaustedError, QuotaScheduler, is_quota_error, retry_delay_hint, upstream_priority
+from . import metrics
+from .schedule_parser import convert_with_rules
+from .conversion_cache import ConversionCache, fingerprint, normalize_text
+from .concurrency import ConcurrencyLimiter, QueueFullError
+from .batch import PackedItem, build_batch_prompt, estimate_tokens, pack_items, split_batch_output
+from .aixm_normalizer import NormalizationError, normalize_aixm_output
+from .streaming import TimeIntervalSplitter, split_time_intervals, sse_event
+from .routing import ModelRouter, OutputTruncatedError, RoutingDecision, is_truncated
+from .hedging import HedgePolicy, LatencyTracker, hedged_call
+from .canonicalize import canonicalize_xml
+from .few_shot import FewShotPromptBuilder, render_example, render_tail
+from .prompt_examples import EXAMPLES
+from .compact_schedule import build_compact_prompt, compact_generation_config, compact_prompt_template, expand_compact_output
 
-load_dotenv()
+# Vercel injects environment variables directly; .env files are only for local runs
+if not os.getenv("VERCEL"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Aeronautical Schedule Converter API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        await model_clients.warm_up(
+            [(PRIMARY_MODEL, PRIMARY_GENERATION_CONFIG), (FALLBACK_MODEL, FALLBACK_GENERATION_CONFIG)],
+            ping=WARMUP_PING,
+        )
+    stop_worker = asyncio.Event()
+    worker_task = asyncio.create_task(job_worker.run(stop_worker)) if JOB_WORKER_IN_APP else None
+    yield
+    if worker_task is not None:
+        stop_worker.set()
+        worker_task.cancel()
+        await asyncio.gather(worker_task, return_exceptions=True)
+    await model_clients.aclose()
+
+
+# JSON bodies are rendered with orjson instead of the stdlib encoder
+app = FastAPI(title="Aeronautical Schedule Converter API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,28 +69,105 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route request metrics for /metrics; SERVER_TIMING_ENABLED adds a per-request stage breakdown header
+app.add_middleware(
+    metrics.MetricsMiddleware,
+    routes=app.routes,
+    server_timing=os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true",
+)
+# brotli/gzip per Accept-Encoding for bodies of RESPONSE_COMPRESSION_MIN_BYTES or more (not SSE)
+if os.getenv("RESPONSE_COMPRESSION_ENABLED", "true").lower() != "false":
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")),
+        gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("BROTLI_QUALITY", "4")),
+    )
 
 class ScheduleRequest(BaseModel):
     text: str
+    canonicalize: bool = False  # merge per-day expansions into minimal timesheets
+
+class CanonicalizationInfo(BaseModel):
+    intervals_before: int
+    intervals_after: int
+    intervals_removed: int
 
 class ScheduleResponse(BaseModel):
     aixm_xml: str
     note: Optional[str] = None
+    source: Optional[str] = None  # "rules" (local parser), "cache" or "llm"
+    canonicalization: Optional[CanonicalizationInfo] = None
+
+class BatchItem(BaseModel):
+    id: str
+    text: str
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+
+class BatchResult(BaseModel):
+    id: str
+    aixm_xml: Optional[str] = None
+    note: Optional[str] = None
+    source: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchResult]
+    llm_calls: int  # packed calls plus individual retries
+    retried: int
+
+class JobRequest(BaseModel):
+    text: Optional[str] = None  # a single schedule, or
+    items: Optional[List[BatchItem]] = None  # many, as for /api/convert/batch
+    canonicalize: bool = False
+
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+    total: int
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued | running | done | failed
+    total: int
+    completed: int
+    failed: int
+    progress: float
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    results: Optional[List[BatchResult]] = None  # only with results=true, one page
+    next_after: Optional[int] = None  # cursor for the next page of results, if there may be more
+
+class OpenServicesResponse(BaseModel):
+    job_id: str
+    at: Optional[datetime.datetime] = None
+    start: Optional[datetime.datetime] = None
+    end: Optional[datetime.datetime] = None
+    mode: Optional[str] = None
+    services: int  # indexed services
+    open: List[str]
+    unsupported: List[str]  # schedules the index can't evaluate (never open)
+    annotated: List[str]  # schedules with annotation-only entries (O/R, HX, ...)
 
 # Configure Google Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
     logger.error("FATAL: GEMINI_API_KEY environment variable is not set")
     raise ValueError("GEMINI_API_KEY environment variable is not set")
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    logger.info("Gemini API configured successfully.")
-except Exception as config_error:
-    logger.error(f"FATAL: Error configuring Gemini API: {config_error}")
-    raise
+# The SDK is imported and configured on first use; clients and their gRPC channel are shared across requests
+model_clients = ModelClients(GEMINI_API_KEY, keepalive_seconds=float(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", "300")))
+# Build the clients at startup instead of on the first Gemini request; WARMUP_PING also opens the connection
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+WARMUP_PING = os.getenv("WARMUP_PING", "false").lower() == "true"
+
+# Standard AIP phrasing is converted locally; set to "false" to force every request through Gemini
+RULE_PARSER_ENABLED = os.getenv("RULE_PARSER_ENABLED", "true").lower() != "false"
 
 # --- NEW Detailed Prompt Template ---
-prompt_template = """
+PROMPT_RULES = """
 You are an expert aeronautical information specialist system. Your task is to convert natural language descriptions of aeronautical service operational schedules into strictly formatted AIXM 5.1.1 XML snippets.
 
 ## CONVERSION TASK
@@ -104,295 +222,826 @@ Each `<aixm:Timesheet>` MUST contain the following elements IN THIS ORDER, where
 
 ## EXAMPLES
 
-Input Schedule Text:
-MON-FRI: 0900-1700
-
-Output:
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>WORK_DAY</aixm:day>
-    <aixm:startTime>09:00</aixm:startTime>
-    <aixm:endTime>17:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-
----
-Input Schedule Text:
-MON-THU: 0700-1300, 1400-1800
-
-Output:
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>MON</aixm:day>
-    <aixm:startTime>07:00</aixm:startTime>
-    <aixm:endTime>13:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>MON</aixm:day>
-    <aixm:startTime>14:00</aixm:startTime>
-    <aixm:endTime>18:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>TUE</aixm:day>
-    <aixm:startTime>07:00</aixm:startTime>
-    <aixm:endTime>13:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>TUE</aixm:day>
-    <aixm:startTime>14:00</aixm:startTime>
-    <aixm:endTime>18:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>WED</aixm:day>
-    <aixm:startTime>07:00</aixm:startTime>
-    <aixm:endTime>13:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>WED</aixm:day>
-    <aixm:startTime>14:00</aixm:startTime>
-    <aixm:endTime>18:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>THU</aixm:day>
-    <aixm:startTime>07:00</aixm:startTime>
-    <aixm:endTime>13:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>THU</aixm:day>
-    <aixm:startTime>14:00</aixm:startTime>
-    <aixm:endTime>18:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-
----
-Input Schedule Text:
-MON-FRI except HOL : SUM : 0600 - 2145 - WIN : 0700 - 2100.
-
-Output:
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-04</aixm:startDate>
-    <aixm:endDate>31-10</aixm:endDate>
-    <aixm:day>WORK_DAY</aixm:day>
-    <aixm:startTime>06:00</aixm:startTime>
-    <aixm:endTime>21:45</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-11</aixm:startDate>
-    <aixm:endDate>31-03</aixm:endDate>
-    <aixm:day>WORK_DAY</aixm:day>
-    <aixm:startTime>07:00</aixm:startTime>
-    <aixm:endTime>21:00</aixm:endTime>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>HOL</aixm:day>
-    <aixm:excluded>YES</aixm:excluded>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-
----
-Input Schedule Text:
-MON-SUN : 0800-1700. Extension possible: PPR PN 24 HR .
-
-Output:
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>ANY</aixm:day>
-    <aixm:startTime>08:00</aixm:startTime>
-    <aixm:endTime>17:00</aixm:endTime>
-    <aixm:annotation>
-      <aixm:Note>Extension possible: PPR PN 24 HR .</aixm:Note>
-    </aixm:annotation>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-
----
-Input Schedule Text:
-ATS SKED
-
-Output:
-<aixm:timeInterval>
-  <aixm:Timesheet>
-    <aixm:timeReference>UTC</aixm:timeReference>
-    <aixm:startDate>01-01</aixm:startDate>
-    <aixm:endDate>31-12</aixm:endDate>
-    <aixm:day>ANY</aixm:day>
-    <aixm:annotation>
-      <aixm:Note>ATS SKED</aixm:Note>
-    </aixm:annotation>
-  </aixm:Timesheet>
-</aixm:timeInterval>
-
----
-
-Input Schedule Text: {text_input}
-
-Output:
 """
+# Rules + every example (backend/prompt_examples.py); model calls use prompt_builder's selection
+prompt_template = PROMPT_RULES + "".join(render_example(example) for example in EXAMPLES) + render_tail("{text_input}")
 # --- End of Prompt Template Definition ---
 
+# Rules + examples without the single-input tail, shared by every packed batch prompt
+PROMPT_PREFIX = prompt_template[:prompt_template.index("Input Schedule Text: {text_input}")]
 
-@app.post("/api/convert", response_model=ScheduleResponse)
-async def convert_schedule(request: ScheduleRequest):
+PRIMARY_MODEL = "gemini-2.0-flash" #changed the model for faster req , it hits vercel runtime : error504
+PRIMARY_GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 4096, # Increased max tokens slightly for complex outputs
+}
+FALLBACK_MODEL = "gemini-2.0-flash-lite"
+FALLBACK_GENERATION_CONFIG = {
+    "temperature": 0.2,
+    "max_output_tokens": 4096, # Keep max tokens consistent
+}
+MODEL_GENERATION_CONFIGS = {PRIMARY_MODEL: PRIMARY_GENERATION_CONFIG, FALLBACK_MODEL: FALLBACK_GENERATION_CONFIG}
+
+# Picks the model tier and max_output_tokens per input from its estimated size
+# (backend/routing.py); disabled, every call uses PRIMARY_MODEL with the flat configs above.
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() != "false"
+model_router = ModelRouter(
+    standard_model=PRIMARY_MODEL,
+    simple_model=FALLBACK_MODEL,
+    simple_max_intervals=int(os.getenv("ROUTER_SIMPLE_MAX_INTERVALS", "2")),
+    min_output_tokens=int(os.getenv("ROUTER_MIN_OUTPUT_TOKENS", "256")),
+    max_output_tokens=int(os.getenv("ROUTER_MAX_OUTPUT_TOKENS", "8192")),
+    headroom=float(os.getenv("ROUTER_HEADROOM", "1.5")),
+)
+# Output tokens per <aixm:timeInterval> (XML) or per compact JSON row
+ROUTER_TOKENS_PER_INTERVAL = {"xml": 90, "compact": 30}
+
+# Each model prompt carries only the FEW_SHOT_K examples most relevant to its input, within
+# FEW_SHOT_TOKEN_BUDGET (backend/few_shot.py); disabled, every prompt carries all of them.
+FEW_SHOT_ENABLED = os.getenv("FEW_SHOT_ENABLED", "true").lower() != "false"
+prompt_builder = FewShotPromptBuilder(
+    PROMPT_RULES,
+    EXAMPLES,
+    k=int(os.getenv("FEW_SHOT_K", "3")),
+    token_budget=int(os.getenv("FEW_SHOT_TOKEN_BUDGET", "1000")),
+)
+
+# "compact": the model answers with short JSON rows that are expanded to AIXM XML locally
+# (far fewer output tokens); "xml": the model writes the full XML itself. Compact answers are
+# JSON-constrained only if the SDK supports response_mime_type; the pinned 0.3.1 doesn't, so
+# they rely on the prompt plus validation and repair retries (a warning is logged once).
+LLM_OUTPUT_FORMAT = os.getenv("LLM_OUTPUT_FORMAT", "xml").lower()
+if LLM_OUTPUT_FORMAT not in ("xml", "compact"):
+    raise ValueError(f"LLM_OUTPUT_FORMAT must be 'xml' or 'compact', got {LLM_OUTPUT_FORMAT!r}")
+
+# Same-model retries (with the rejection reason) for output the normalizer can't repair
+OUTPUT_REPAIR_RETRIES = int(os.getenv("OUTPUT_REPAIR_RETRIES", "1"))
+
+# Whole-request budget for upstream calls; keep below the platform's function timeout
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "25"))
+# Launch the fallback in parallel once the primary exceeds this percentile of its recent latency
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() != "false"
+latency_tracker = LatencyTracker()
+hedge_policy = HedgePolicy(
+    latency_tracker,
+    percentile=float(os.getenv("HEDGE_PERCENTILE", "90")),
+    initial_delay=float(os.getenv("HEDGE_INITIAL_DELAY", "4")),
+    min_delay=float(os.getenv("HEDGE_MIN_DELAY", "0.5")),
+    max_delay=float(os.getenv("HEDGE_MAX_DELAY", "8")),
+)
+
+# Anything that changes model output is part of the cache namespace, so editing the
+# prompt or switching models invalidates old entries automatically.
+conversion_cache = ConversionCache(
+    namespace=fingerprint(
+        LLM_OUTPUT_FORMAT,
+        prompt_template if LLM_OUTPUT_FORMAT == "xml" else compact_prompt_template,
+        PRIMARY_MODEL, PRIMARY_GENERATION_CONFIG,
+        FALLBACK_MODEL, FALLBACK_GENERATION_CONFIG,
+        MODEL_ROUTING_ENABLED, vars(model_router),
+        FEW_SHOT_ENABLED, prompt_builder.k, prompt_builder.token_budget,
+    ),
+    max_entries=int(os.getenv("CONVERSION_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("CONVERSION_CACHE_TTL", "3600")),
+    db_path=os.getenv("CONVERSION_CACHE_DB", "/tmp/conversion_cache.sqlite3") or None,
+)
+
+# Bounds concurrent Gemini calls per worker; excess requests wait in a bounded queue
+upstream_limiter = ConcurrencyLimiter(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8")),
+    max_queue=int(os.getenv("LLM_QUEUE_SIZE", "64")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "20")),
+)
+
+# Requests/tokens per minute per model (per process); MODEL_QUOTAS overrides, e.g. '{"gemini-2.0-flash": {"rpm": 15}}'
+MODEL_QUOTAS = {
+    PRIMARY_MODEL: {"rpm": 2000, "tpm": 4_000_000},
+    FALLBACK_MODEL: {"rpm": 4000, "tpm": 4_000_000},
+}
+for model_name, overrides in json.loads(os.getenv("MODEL_QUOTAS", "{}")).items():
+    MODEL_QUOTAS[model_name] = {**MODEL_QUOTAS.get(model_name, {}), **overrides}
+upstream_scheduler = QuotaScheduler(
+    limits=MODEL_QUOTAS,
+    default_limits={"rpm": 1000, "tpm": 1_000_000},
+    max_queue=int(os.getenv("QUOTA_QUEUE_SIZE", "64")),
+    max_wait={
+        Priority.INTERACTIVE: float(os.getenv("QUOTA_MAX_WAIT", "10")),
+        Priority.BATCH: float(os.getenv("QUOTA_BATCH_MAX_WAIT", "30")),
+        Priority.BULK: float(os.getenv("QUOTA_BULK_MAX_WAIT", "300")),
+    },
+    backoff_initial=float(os.getenv("QUOTA_BACKOFF_INITIAL", "2")),
+    backoff_max=float(os.getenv("QUOTA_BACKOFF_MAX", "60")),
+)
+# Output tokens reserved per call before the real count is known
+QUOTA_OUTPUT_TOKEN_ESTIMATE = int(os.getenv("QUOTA_OUTPUT_TOKEN_ESTIMATE", "400"))
+
+
+def model_label(model) -> str:
+    return str(getattr(model, "model_name", "unknown")).removeprefix("models/")
+
+
+def record_tokens(model_name: str, prompt: str, output: str, usage=None) -> int:
+    """Token counts from the SDK's usage metadata when present, estimated otherwise; returns the total."""
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt)
+    output_tokens = getattr(usage, "candidates_token_count", 0) or estimate_tokens(output)
+    metrics.PROMPT_TOKENS.observe(prompt_tokens, model=model_name)
+    metrics.OUTPUT_TOKENS.observe(output_tokens, model=model_name)
+    return prompt_tokens + output_tokens
+
+
+async def admit_upstream(model_name: str, prompt: str):
+    """Reserves quota for one call; rejections are counted and re-raised."""
     try:
-        # Configure the model
-        generation_config = {
-            "temperature": 0.2,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 4096, # Increased max tokens slightly for complex outputs
-        }
+        return await upstream_scheduler.acquire(model_name, estimate_tokens(prompt) + QUOTA_OUTPUT_TOKEN_ESTIMATE)
+    except QuotaExhaustedError as quota_error:
+        metrics.QUOTA_REJECTIONS.inc(model=model_name, reason=quota_error.reason)
+        raise
+
+
+def upstream_failed(model_name: str, call_error: Exception) -> Exception:
+    """Classifies a failed call; quota errors pause the model and become QuotaExhaustedError."""
+    if is_quota_error(call_error):
+        metrics.MODEL_CALLS.inc(model=model_name, outcome="quota_error")
+        metrics.QUOTA_BACKOFFS.inc(model=model_name)
+        delay = upstream_scheduler.backoff(model_name, retry_delay_hint(call_error))
+        return QuotaExhaustedError(f"{model_name} quota exhausted: {call_error}", delay, model_name, "quota error")
+    rejected = isinstance(call_error, (QueueFullError, QuotaExhaustedError))
+    metrics.MODEL_CALLS.inc(model=model_name, outcome="rejected" if rejected else "error")
+    return call_error
+
+
+async def generate_text(model, prompt: str, max_output_tokens: Optional[int] = None, record_latency: bool = False) -> str:
+    """
+    Runs one upstream call through the SDK's async API once admitted by quota and inside
+    a limiter slot. With max_output_tokens given, an answer cut off at that limit raises
+    OutputTruncatedError instead of being returned. With record_latency, a complete
+    answer's upstream duration (excluding quota and limiter waits) feeds the hedge delay.
+    """
+    model_name = model_label(model)
+    queued_at = time.perf_counter()
+    try:
+        grant = await admit_upstream(model_name, prompt)
+        async with upstream_limiter.slot():
+            metrics.record_stage("queue", time.perf_counter() - queued_at)
+            called_at = time.perf_counter()
+            with metrics.stage("upstream"):
+                response = await model.generate_content_async(prompt)
+            upstream_seconds = time.perf_counter() - called_at
+            text = response.text
+    except Exception as call_error:
+        failure = upstream_failed(model_name, call_error)
+        if failure is call_error:
+            raise
+        raise failure from call_error
+    upstream_scheduler.succeeded(model_name)
+    grant.settle(record_tokens(model_name, prompt, text, getattr(response, "usage_metadata", None)))
+    if max_output_tokens is not None and is_truncated(response):
+        metrics.MODEL_CALLS.inc(model=model_name, outcome="truncated")
+        raise OutputTruncatedError(model_name, max_output_tokens)
+    metrics.MODEL_CALLS.inc(model=model_name, outcome="ok")
+    if record_latency:
+        latency_tracker.record(model_name, upstream_seconds)
+    return text
+
 
+async def convert_locally(text: str) -> Optional[ScheduleResponse]:
+    """Answers from the rule parser or the conversion cache; None if Gemini is needed."""
+    if RULE_PARSER_ENABLED:
+        start_time = time.perf_counter()
+        with metrics.stage("rules"):
+            rules_xml = convert_with_rules(text)
+        if rules_xml is not None:
+            logger.info(f"Converted with local rule parser in {(time.perf_counter() - start_time) * 1e6:.0f} us")
+            metrics.CONVERSIONS.inc(source="rules")
+            return ScheduleResponse(aixm_xml=rules_xml, source="rules")
+        logger.info("Rule parser could not fully parse input, falling back to Gemini.")
+
+    with metrics.stage("cache"):
+        cached = await conversion_cache.aget(text)
+    metrics.CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+    if cached is not None:
+        cached_xml, cached_note = cached
+        logger.info("Served conversion from conversion cache.")
+        metrics.CONVERSIONS.inc(source="cache")
+        return ScheduleResponse(aixm_xml=cached_xml, note=cached_note, source="cache")
+    return None
+
+
+# Identical conversions already running upstream are joined rather than repeated
+conversion_flights: SingleFlight[ScheduleResponse] = SingleFlight()
+
+
+async def run_conversion(text: str) -> ScheduleResponse:
+    """Conversion core shared by the HTTP endpoints: rule parser, cache, then Gemini with fallback."""
+    local = await convert_locally(text)
+    if local is not None:
+        return local
+    # The cache key covers the normalized text and the model/prompt configuration
+    response, coalesced = await conversion_flights.do(conversion_cache.key(text), lambda: convert_with_model(text))
+    if coalesced:
+        metrics.COALESCED_REQUESTS.inc()
+    return response
+
+
+async def call_model(
+    model_name: str,
+    generation_config: Dict[str, Any],
+    prompt: str,
+    process: Callable[[str], str] = normalize_aixm_output,
+) -> str:
+    """
+    One upstream call, turned into AIXM XML by process; successful upstream durations
+    feed the hedge delay. Output that process rejects (ValueError) is retried on the
+    same model with the rejection reason, up to OUTPUT_REPAIR_RETRIES times. Output cut
+    off at max_output_tokens is retried with a doubled budget, up to the router's maximum.
+    """
+    model = model_clients.get(model_name, generation_config)
+    attempt = 0
+    while True:
+        logger.info(f"Calling Gemini model ({model_name})...")
+        start_time = time.time()
+        budget = generation_config.get("max_output_tokens")
+        try:
+            response_text = await generate_text(model, prompt, budget, record_latency=True)
+        except OutputTruncatedError:
+            larger = model_router.next_budget(budget)
+            if larger <= budget:
+                raise
+            logger.warning(f"Output from {model_name} hit max_output_tokens={budget}; retrying with {larger} ({time.time() - start_time:.2f}s lost)")
+            metrics.TRUNCATION_RETRIES.inc(model=model_name)
+            generation_config = {**generation_config, "max_output_tokens": larger}
+            model = model_clients.get(model_name, generation_config)
+            continue
+        end_time = time.time()
+        logger.info(f"Gemini call ({model_name}) finished. Duration: {end_time - start_time:.2f} seconds")
         try:
-            # primary model
-            model = genai.GenerativeModel(
-                model_name="gemini-2.0-flash", #changed the model for faster req , it hits vercel runtime : error504
-                generation_config=generation_config
+            with metrics.stage("postprocess"):
+                return process(response_text)
+        except ValueError as output_error:
+            metrics.MODEL_CALLS.inc(model=model_name, outcome="invalid_output")
+            if attempt == OUTPUT_REPAIR_RETRIES:
+                raise
+            attempt += 1
+            logger.warning(f"Output from {model_name} could not be repaired locally ({output_error}); retrying.")
+            head, _, _ = prompt.rpartition("Output:")
+            prompt = (
+                f"{head.rstrip()}\n\nA previous answer to this input was rejected: {output_error}. "
+                "Follow the output requirements exactly.\n\nOutput:\n"
             )
 
-            # Format the template with the user's input text
-            prompt = prompt_template.format(text_input=request.text)
-
-            logger.info("Calling Gemini model (gemini-1.5-pro)...")
-            start_time = time.time()
-            response = model.generate_content(prompt)
-            end_time = time.time()
-            logger.info(f"Gemini call (gemini-1.5-pro) finished. Duration: {end_time - start_time:.2f} seconds")
-
-            # Extract the XML from the response
-            aixm_xml = response.text.strip()
-
-            # Post-processing to ensure correct format
-            aixm_xml = re.sub(r'<\?xml[^>]*\?>|<aixm:PropertiesWithSchedule[^>]*>|</aixm:PropertiesWithSchedule>', '', aixm_xml)
-            aixm_xml = re.sub(r'```xml|```', '', aixm_xml).strip()
-            aixm_xml = re.sub(r'<aixm:startTime>(\d{2})(\d{2})</aixm:startTime>', r'<aixm:startTime>\1:\2</aixm:startTime>', aixm_xml)
-            aixm_xml = re.sub(r'<aixm:endTime>(\d{2})(\d{2})</aixm:endTime>', r'<aixm:endTime>\1:\2</aixm:endTime>', aixm_xml)
-
-            logger.info("Successfully processed /api/convert request with primary model.")
-            return ScheduleResponse(aixm_xml=aixm_xml)
-
-        except Exception as model_error:
-            logger.warning(f"Error with primary model: {str(model_error)}")
-            logger.info("Attempting fallback to gemini-2.0-flash-lite model") 
-
-            fallback_model = genai.GenerativeModel(
-                model_name="gemini-2.0-flash-lite", # Switched to flash for fallback
-                generation_config={
-                    "temperature": 0.2,
-                    "max_output_tokens": 4096, # Keep max tokens consistent
-                }
-            )
 
-            prompt_fallback = prompt_template.format(text_input=request.text)
+def build_prompt(text: str) -> str:
+    """XML-mode prompt for text: rules, the selected examples and the input."""
+    if not FEW_SHOT_ENABLED:
+        return prompt_builder.build_full(text)
+    selection = prompt_builder.select(text)
+    logger.debug(f"Few-shot examples for {text[:40]!r}: {prompt_builder.names(selection)}")
+    return prompt_builder.prefix(selection) + render_tail(text)
 
-            # --- Add Timing Log for Fallback ---
-            logger.info("Calling Gemini model (gemini-1.5-flash fallback)...")
-            start_time_fb = time.time()
-            fallback_response = fallback_model.generate_content(prompt_fallback)
-            end_time_fb = time.time()
-            logger.info(f"Gemini call (gemini-1.5-flash fallback) finished. Duration: {end_time_fb - start_time_fb:.2f} seconds")
 
-            # Extract the XML from the response
-            fallback_aixm_xml = fallback_response.text.strip()
+def route_conversion(text: str) -> RoutingDecision:
+    """Model tier and output budget for text; the flat primary/fallback setup when routing is off."""
+    if not MODEL_ROUTING_ENABLED:
+        return RoutingDecision("fixed", PRIMARY_MODEL, FALLBACK_MODEL, PRIMARY_GENERATION_CONFIG["max_output_tokens"])
+    start_time = time.perf_counter()
+    with metrics.stage("route"):
+        decision = model_router.route(text, ROUTER_TOKENS_PER_INTERVAL[LLM_OUTPUT_FORMAT])
+    complexity = decision.complexity
+    logger.info(
+        f"Routed to {decision.model} ({decision.tier}: ~{complexity.estimated_intervals} intervals from "
+        f"{complexity.days} days, {complexity.slots} slots, {complexity.seasons} seasons, {complexity.exclusions} exclusions, "
+        f"{complexity.annotations} annotations; max_output_tokens={decision.max_output_tokens}) "
+        f"in {(time.perf_counter() - start_time) * 1e6:.0f} us"
+    )
+    return decision
 
-            # Apply the same post-processing
-            fallback_aixm_xml = re.sub(r'<\?xml[^>]*\?>|<aixm:PropertiesWithSchedule[^>]*>|</aixm:PropertiesWithSchedule>', '', fallback_aixm_xml)
-            fallback_aixm_xml = re.sub(r'```xml|```', '', fallback_aixm_xml).strip()
-            fallback_aixm_xml = re.sub(r'<aixm:startTime>(\d{2})(\d{2})</aixm:startTime>', r'<aixm:startTime>\1:\2</aixm:startTime>', fallback_aixm_xml)
-            fallback_aixm_xml = re.sub(r'<aixm:endTime>(\d{2})(\d{2})</aixm:endTime>', r'<aixm:endTime>\1:\2</aixm:endTime>', fallback_aixm_xml)
 
-            logger.info("Successfully processed /api/convert request with fallback model.")
-            return ScheduleResponse(
-                aixm_xml=fallback_aixm_xml,
-                note="Generated using fallback model (gemini-1.5-flash)" # Updated note
-            )
+async def convert_with_model(text: str) -> ScheduleResponse:
+    """
+    Converts text with the routed Gemini model, hedging with the other model if the
+    routed one is slower than usual or fails, all within REQUEST_DEADLINE.
+    """
+    decision = route_conversion(text)
+    primary_model, fallback_model = decision.model, decision.fallback_model
+    primary_config = {**MODEL_GENERATION_CONFIGS[primary_model], "max_output_tokens": decision.max_output_tokens}
+    fallback_config = {**MODEL_GENERATION_CONFIGS[fallback_model], "max_output_tokens": decision.max_output_tokens}
+    with metrics.stage("prompt"):
+        if LLM_OUTPUT_FORMAT == "compact":
+            prompt = build_compact_prompt(text)
+            process = expand_compact_output
+            primary_config = compact_generation_config(primary_config)
+            fallback_config = compact_generation_config(fallback_config)
+        else:
+            prompt = build_prompt(text)
+            process = normalize_aixm_output
+
+    started = time.perf_counter()
+    hedge_delay = hedge_policy.delay_for(primary_model) if HEDGING_ENABLED else REQUEST_DEADLINE
+    result = await hedged_call(
+        primary=(primary_model, lambda: call_model(primary_model, primary_config, prompt, process)),
+        fallback=(fallback_model, lambda: call_model(fallback_model, fallback_config, prompt, process)),
+        hedge_delay=hedge_delay,
+        timeout=REQUEST_DEADLINE,
+        # Overloaded, not a model failure: the fallback would just queue behind the same limiter.
+        # Quota errors back the model off instead of spending the fallback's quota on the same surge.
+        fatal_errors=(QueueFullError, QuotaExhaustedError),
+    )
+
+    if result.winner == primary_model:
+        note = f"Generated by {primary_model} (won hedged race)" if result.hedged else None
+    elif result.hedged:
+        note = f"Generated using fallback model ({fallback_model}, won hedged race after {hedge_delay:.1f}s)"
+    else:
+        note = f"Generated using fallback model ({fallback_model})"
+    duration = time.perf_counter() - started
+    metrics.ROUTING_DECISIONS.inc(tier=decision.tier, model=primary_model)
+    metrics.ROUTED_DURATION.observe(duration, tier=decision.tier)
+    logger.info(f"Routed conversion ({decision.tier}, {primary_model}, max_output_tokens={decision.max_output_tokens}) answered by {result.winner} in {duration:.2f}s")
+    await conversion_cache.aset(text, result.value, note)
+    metrics.MODEL_WINS.inc(model=result.winner, hedged=str(result.hedged).lower())
+    metrics.CONVERSIONS.inc(source="llm")
+    logger.info(f"Successfully processed conversion with {result.winner}{' (hedged)' if result.hedged else ''}.")
+    return ScheduleResponse(aixm_xml=result.value, note=note, source="llm")
+
+
+def apply_canonicalization(response: ScheduleResponse) -> ScheduleResponse:
+    """Merges per-day expansions; leaves the response untouched if it can't be represented."""
+    try:
+        with metrics.stage("canonicalize"):
+            aixm_xml, report = canonicalize_xml(response.aixm_xml)
+    except ValueError as canonical_error:
+        logger.warning(f"Skipping canonicalization: {canonical_error}")
+        return response
+    logger.info(f"Canonicalized {report.intervals_before} intervals into {report.intervals_after}.")
+    return response.model_copy(update={
+        "aixm_xml": aixm_xml,
+        "canonicalization": CanonicalizationInfo(
+            intervals_before=report.intervals_before,
+            intervals_after=report.intervals_after,
+            intervals_removed=report.removed,
+        ),
+    })
+
 
+def overload_rejection(endpoint: str, overload_error: Exception) -> HTTPException:
+    """503 for a full upstream queue, 429 for exhausted quota, both with Retry-After."""
+    logger.warning(f"Rejecting {endpoint} request: {overload_error}")
+    metrics.ERRORS.inc(endpoint=endpoint, error=type(overload_error).__name__)
+    return HTTPException(
+        status_code=503 if isinstance(overload_error, QueueFullError) else 429,
+        detail=str(overload_error),
+        headers={"Retry-After": str(overload_error.retry_after)},
+    )
+
+
+@app.post("/api/convert", response_model=ScheduleResponse)
+async def convert_schedule(request: ScheduleRequest):
+    try:
+        response = await run_conversion(request.text)
+        if request.canonicalize:
+            response = apply_canonicalization(response)
+        return response
+    except (QueueFullError, QuotaExhaustedError) as overload_error:
+        raise overload_rejection("/api/convert", overload_error)
+    except asyncio.TimeoutError as deadline_error:
+        logger.warning(f"/api/convert exceeded its deadline: {deadline_error}")
+        metrics.ERRORS.inc(endpoint="/api/convert", error="TimeoutError")
+        raise HTTPException(status_code=504, detail=f"Conversion did not finish within {REQUEST_DEADLINE:.0f}s")
     except Exception as e:
         logger.exception("Error processing schedule conversion request in /api/convert")
+        metrics.ERRORS.inc(endpoint="/api/convert", error=type(e).__name__)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def stream_model_text(model_name: str, generation_config: Dict[str, Any], prompt: str):
+    """
+    Yields text chunks from a streaming Gemini call, holding one limiter slot throughout.
+    A stream that stops at max_output_tokens raises OutputTruncatedError after its last chunk.
+    """
+    model = model_clients.get(model_name, generation_config)
+    queued_at = time.perf_counter()
+    output: List[str] = []
+    chunk = None
+    try:
+        grant = await admit_upstream(model_name, prompt)
+        async with upstream_limiter.slot():
+            metrics.record_stage("queue", time.perf_counter() - queued_at)
+            with metrics.stage("upstream"):
+                response = await model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    output.append(chunk.text)
+                    yield chunk.text
+    except Exception as call_error:
+        failure = upstream_failed(model_name, call_error)
+        if failure is call_error:
+            raise
+        raise failure from call_error
+    upstream_scheduler.succeeded(model_name)
+    grant.settle(record_tokens(model_name, prompt, "".join(output)))
+    if chunk is not None and is_truncated(chunk):
+        metrics.MODEL_CALLS.inc(model=model_name, outcome="truncated")
+        raise OutputTruncatedError(model_name, generation_config.get("max_output_tokens"))
+    metrics.MODEL_CALLS.inc(model=model_name, outcome="ok")
+
+
+async def stream_conversion(text: str):
+    """
+    SSE generator: one "interval" event per finished timeInterval, then "done" (or "error").
+
+    Models come from the same routing decision as /api/convert, and the prompt from
+    the same few-shot builder. Three things differ, all because intervals already sent
+    can't be taken back: the model always writes XML, even with
+    LLM_OUTPUT_FORMAT=compact, so intervals can be split off as it arrives; calls are
+    not hedged, and the fallback only runs if the routed model fails before the first
+    interval; and instead of the routed output budget, which /api/convert can retry
+    with a larger one, every stream gets the router's maximum. A stream cut off at
+    that limit anyway ends with "error" and is not cached.
+    """
+    local = await convert_locally(text)
+    if local is not None:
+        for element in split_time_intervals(local.aixm_xml):
+            yield sse_event("interval", {"xml": element})
+        yield sse_event("done", {"source": local.source, "note": local.note})
+        return
+
+    decision = route_conversion(text)
+    primary_model, fallback_model = decision.model, decision.fallback_model
+    with metrics.stage("prompt"):
+        prompt = build_prompt(text)
+    start_time = time.perf_counter()
+    emitted: List[str] = []
+    for model_name, note in (
+        (primary_model, None),
+        (fallback_model, f"Generated using fallback model ({fallback_model})"),
+    ):
+        generation_config = {
+            **MODEL_GENERATION_CONFIGS[model_name],
+            "max_output_tokens": max(decision.max_output_tokens, model_router.max_output_tokens),
+        }
+        splitter = TimeIntervalSplitter()
+        try:
+            logger.info(f"Streaming from Gemini model ({model_name})...")
+            async for chunk_text in stream_model_text(model_name, generation_config, prompt):
+                for element in splitter.feed(chunk_text):
+                    if not emitted:
+                        logger.info(f"Time to first interval ({model_name}): {time.perf_counter() - start_time:.2f} seconds")
+                    element = normalize_aixm_output(element)
+                    emitted.append(element)
+                    yield sse_event("interval", {"xml": element})
+            if splitter.pending:
+                raise ValueError("Model output ended inside a timeInterval element")
+            if not emitted:
+                raise ValueError("Model returned no timeInterval elements")
+        except (QueueFullError, QuotaExhaustedError) as queue_error:
+            logger.warning(f"Rejecting /api/convert/stream request: {queue_error}")
+            metrics.ERRORS.inc(endpoint="/api/convert/stream", error=type(queue_error).__name__)
+            yield sse_event("error", {"detail": str(queue_error), "retry_after": queue_error.retry_after})
+            return
+        except Exception as stream_error:
+            # Intervals already sent can't be taken back, so only fall back before the first one
+            if emitted or model_name == fallback_model:
+                logger.exception("Error streaming schedule conversion in /api/convert/stream")
+                metrics.ERRORS.inc(endpoint="/api/convert/stream", error=type(stream_error).__name__)
+                yield sse_event("error", {"detail": str(stream_error)})
+                return
+            logger.warning(f"Error streaming from routed model {model_name}: {stream_error}")
+            continue
+
+        await conversion_cache.aset(text, "\n".join(emitted), note)
+        metrics.ROUTING_DECISIONS.inc(tier=decision.tier, model=primary_model)
+        metrics.MODEL_WINS.inc(model=model_name, hedged="false")
+        metrics.CONVERSIONS.inc(source="llm")
+        logger.info(f"Streamed {len(emitted)} intervals ({model_name}). Duration: {time.perf_counter() - start_time:.2f} seconds")
+        yield sse_event("done", {"source": "llm", "note": note})
+        return
+
+
+@app.post("/api/convert/stream")
+async def convert_schedule_stream(request: ScheduleRequest):
+    """Server-sent events variant of /api/convert that emits intervals as they are generated."""
+    return StreamingResponse(
+        stream_conversion(request.text),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_PACK_SIZE = int(os.getenv("BATCH_PACK_SIZE", "12"))
+# Kept well under max_output_tokens so a full pack is never truncated
+BATCH_OUTPUT_TOKEN_BUDGET = int(os.getenv("BATCH_OUTPUT_TOKEN_BUDGET", "3000"))
+
+
+async def convert_pack(pack: List[PackedItem]) -> Dict[str, str]:
+    """Runs one packed prompt; returns post-processed XML for the items that split and validate."""
+    model = model_clients.get(PRIMARY_MODEL, PRIMARY_GENERATION_CONFIG)
+    prompt = build_batch_prompt(PROMPT_PREFIX, pack)
+    start_time = time.time()
+    try:
+        response_text = await generate_text(model, prompt)
+    except (QueueFullError, QuotaExhaustedError):
+        # Overload, not a bad answer: retrying items one by one would only multiply the calls
+        raise
+    except Exception as pack_error:
+        logger.warning(f"Packed batch call for {len(pack)} items failed: {pack_error}")
+        return {}
+    logger.info(f"Packed batch call ({len(pack)} items, {PRIMARY_MODEL}) finished. Duration: {time.time() - start_time:.2f} seconds")
+
+    converted = {}
+    for slot, raw_part in split_batch_output(response_text, len(pack)).items():
+        try:
+            converted[pack[slot].key] = normalize_aixm_output(raw_part)
+        except NormalizationError as output_error:
+            logger.warning(f"Batch item output rejected, will retry individually: {output_error}")
+    return converted
+
+
+@app.post("/api/convert/batch", response_model=BatchResponse)
+async def convert_batch(request: BatchRequest):
+    """Converts many schedules, packing the ones that need Gemini into a few shared prompts."""
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+    ids = [item.id for item in request.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Batch item ids must be unique")
+    # Queued behind interactive conversions when quota is short
+    upstream_priority.set(Priority.BATCH)
+
+    # Identical texts are converted once and fanned back out to every id
+    texts: Dict[str, str] = {}
+    for item in request.items:
+        texts.setdefault(normalize_text(item.text), item.text)
+
+    outcomes: Dict[str, BatchResult] = {}
+    pending: List[PackedItem] = []
+    for key, text in texts.items():
+        local = await convert_locally(text)
+        if local is not None:
+            outcomes[key] = BatchResult(id="", **local.model_dump())
+        else:
+            pending.append(PackedItem(0, key, text))
+
+    packs = pack_items(pending, BATCH_OUTPUT_TOKEN_BUDGET, BATCH_PACK_SIZE)
+    converted: Dict[str, str] = {}
+    pack_results = await asyncio.gather(*(convert_pack(pack) for pack in packs), return_exceptions=True)
+    for pack_result in pack_results:
+        if isinstance(pack_result, (QueueFullError, QuotaExhaustedError)):
+            raise overload_rejection("/api/convert/batch", pack_result)
+        if isinstance(pack_result, BaseException):
+            raise pack_result
+        converted.update(pack_result)
+
+    failed = []
+    for item in pending:
+        if item.key in converted:
+            await conversion_cache.aset(item.text, converted[item.key])
+            metrics.CONVERSIONS.inc(source="llm")
+            outcomes[item.key] = BatchResult(id="", aixm_xml=converted[item.key], source="llm")
+        else:
+            failed.append(item)
+
+    # Only items that failed to split or validate are retried, one call each
+    if failed:
+        logger.info(f"Retrying {len(failed)} of {len(pending)} batch items individually.")
+    retries = await asyncio.gather(*(convert_with_model(item.text) for item in failed), return_exceptions=True)
+    for retry in retries:
+        if isinstance(retry, (QueueFullError, QuotaExhaustedError)):
+            raise overload_rejection("/api/convert/batch", retry)
+    for item, retry in zip(failed, retries):
+        if isinstance(retry, Exception):
+            metrics.ERRORS.inc(endpoint="/api/convert/batch", error=type(retry).__name__)
+            outcomes[item.key] = BatchResult(id="", error=str(retry))
+        else:
+            outcomes[item.key] = BatchResult(id="", **retry.model_dump())
+
+    results = [
+        outcomes[normalize_text(item.text)].model_copy(update={"id": item.id})
+        for item in request.items
+    ]
+    logger.info(f"Processed batch of {len(request.items)} items ({len(texts)} unique, {len(packs)} packed calls, {len(failed)} retried).")
+    return BatchResponse(results=results, llm_calls=len(packs) + len(failed), retried=len(failed))
+
+
+# Jobs persist in SQLite; the in-process worker is off on Vercel, where nothing runs between requests
+job_store = JobStore(os.getenv("JOBS_DB", "/tmp/conversion_jobs.sqlite3"))
+job_worker = JobWorker(
+    job_store,
+    concurrency=int(os.getenv("JOB_CONCURRENCY", "8")),
+    parallel_jobs=int(os.getenv("JOB_PARALLEL", "2")),
+)
+JOB_WORKER_IN_APP = os.getenv("JOB_WORKER_IN_APP", "false" if os.getenv("VERCEL") else "true").lower() == "true"
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "10000"))
+# Results come in pages so a status poll doesn't grow with the job
+JOB_RESULTS_PAGE_SIZE = int(os.getenv("JOB_RESULTS_PAGE_SIZE", "500"))
+JOB_RESULTS_PAGE_MAX = int(os.getenv("JOB_RESULTS_PAGE_MAX", "2000"))
+
+
+@app.post("/api/jobs", response_model=JobCreated, status_code=202)
+async def create_job(request: JobRequest):
+    """Queues a conversion job and returns its id without waiting for the result."""
+    if (request.text is None) == (request.items is None):
+        raise HTTPException(status_code=400, detail="Provide either text or items")
+    items = [("1", request.text)] if request.text is not None else [(item.id, item.text) for item in request.items]
+    if not items or len(items) > JOB_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A job needs between 1 and {JOB_MAX_ITEMS} items")
+    if len({item_id for item_id, _ in items}) != len(items):
+        raise HTTPException(status_code=400, detail="Job item ids must be unique")
+    job_id = await asyncio.to_thread(job_store.create, items, canonicalize=request.canonicalize)
+    job_worker.notify()
+    logger.info(f"Queued job {job_id} with {len(items)} items.")
+    return JobCreated(job_id=job_id, status="queued", total=len(items))
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, results: bool = False, after: int = -1, limit: int = JOB_RESULTS_PAGE_SIZE):
+    """
+    Job status and progress. With results=true, also up to limit finished items past
+    submission position after, stopping at the first item still pending; next_after
+    is the cursor for the next page, set while the job runs or a page came back full.
+    """
+    if not 1 <= limit <= JOB_RESULTS_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {JOB_RESULTS_PAGE_MAX}")
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    rows = await asyncio.to_thread(job_store.results, job_id, after, limit) if results else None
+    more = rows is not None and (len(rows) == limit or job["status"] in ("queued", "running"))
+    return JobStatus(
+        job_id=job["id"],
+        status=job["status"],
+        total=job["total"],
+        completed=job["completed"],
+        failed=job["failed"],
+        progress=round(job["completed"] / job["total"], 4) if job["total"] else 1.0,
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        results=[
+            BatchResult(id=row["item_id"], aixm_xml=row["aixm_xml"], note=row["note"], source=row["source"], error=row["error"])
+            for row in rows
+        ] if rows is not None else None,
+        next_after=(rows[-1]["position"] if rows else after) if more else None,
+    )
+
+
+@app.get("/api/jobs/{job_id}/aixm")
+async def export_job_aixm(job_id: str, gzip: bool = False, feature: str = "AirTrafficControlService"):
+    """Streams a finished job's results as one AIXM 5.1.1 message (one feature per item)."""
+    from .aixm_export import AixmExporter, export_chunks
+
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; export needs a finished job")
+    if not re.fullmatch(r"[A-Za-z]+Service", feature):
+        raise HTTPException(status_code=400, detail="feature must be an AIXM service feature name")
+    records = ((row["item_id"], row["aixm_xml"]) for row in job_store.iter_results(job_id) if not row["error"])
+    filename = f"aixm_{job_id}.xml" + (".gz" if gzip else "")
+    # A sync generator: Starlette iterates it in a worker thread, so SQLite paging stays off the event loop
+    return StreamingResponse(
+        export_chunks(records, gzip=gzip, exporter=AixmExporter(feature=feature)),
+        media_type="application/gzip" if gzip else "application/xml",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+# Compiled schedule indexes of finished jobs, keyed by job id and holiday list
+SCHEDULE_INDEX_CACHE_SIZE = int(os.getenv("SCHEDULE_INDEX_CACHE_SIZE", "8"))
+schedule_indexes: "OrderedDict[tuple, Any]" = OrderedDict()
+
+
+def parse_holidays(holidays: Optional[str]) -> tuple:
+    try:
+        return tuple(sorted({datetime.date.fromisoformat(value.strip()) for value in (holidays or "").split(",") if value.strip()}))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="holidays must be comma-separated YYYY-MM-DD dates")
+
+
+async def job_schedule_index(job_id: str, holidays: tuple):
+    from .schedule_index import ScheduleIndex
+
+    key = (job_id, holidays)
+    index = schedule_indexes.get(key)
+    if index is None:
+        job = await asyncio.to_thread(job_store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job id")
+        if job["status"] != "done":
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}; queries need a finished job")
+        records = ((row["item_id"], row["aixm_xml"]) for row in job_store.iter_results(job_id) if not row["error"])
+        index = await asyncio.to_thread(ScheduleIndex.build, records, holidays)
+        schedule_indexes[key] = index
+        while len(schedule_indexes) > SCHEDULE_INDEX_CACHE_SIZE:
+            schedule_indexes.popitem(last=False)
+    schedule_indexes.move_to_end(key)
+    return index
+
+
+@app.get("/api/jobs/{job_id}/open", response_model=OpenServicesResponse)
+async def open_services(
+    job_id: str,
+    at: Optional[datetime.datetime] = None,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    mode: str = "any",
+    holidays: Optional[str] = None,
+):
+    """
+    Services of a finished job open at a UTC instant (at=...) or during a window
+    (start=...&end=..., mode=any for open at some point, all for open throughout).
+    """
+    if (at is None) == (start is None or end is None) or (at is not None and (start or end)):
+        raise HTTPException(status_code=400, detail="Provide either at, or start and end")
+    if start is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if mode not in ("any", "all"):
+        raise HTTPException(status_code=400, detail="mode must be any or all")
+    index = await job_schedule_index(job_id, parse_holidays(holidays))
+    with metrics.stage("schedule_query"):
+        # The first query of a year compiles that year's tables; later ones are array lookups
+        if at is not None:
+            mask = await asyncio.to_thread(index.open_at, at)
+        else:
+            mask = await asyncio.to_thread(index.open_between, start, end, mode)
+    return OpenServicesResponse(
+        job_id=job_id,
+        at=at,
+        start=start,
+        end=end,
+        mode=mode if at is None else None,
+        services=len(index),
+        open=index.services(mask),
+        unsupported=sorted(index.unsupported),
+        annotated=sorted(index.annotated),
+    )
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text-format metrics."""
+    metrics.UPSTREAM_IN_FLIGHT.set(upstream_limiter.in_flight)
+    metrics.UPSTREAM_WAITING.set(upstream_limiter.waiting)
+    for model_name, quota in upstream_scheduler.stats()["models"].items():
+        metrics.QUOTA_QUEUED.set(quota["queued"], model=model_name)
+        metrics.QUOTA_BACKOFF_REMAINING.set(quota["backoff_remaining"], model=model_name)
+    flights = conversion_flights.stats()
+    metrics.SINGLEFLIGHT_IN_FLIGHT.set(flights["in_flight"])
+    metrics.SINGLEFLIGHT_WAITERS.set(flights["waiters"])
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the conversion cache."""
+    return conversion_cache.stats()
+
+
+def render_architecture_doc() -> bytes:
+    # fpdf is only imported when the document is first requested
+    from .architecture_doc_generator import ArchitectureDocGenerator
+    return ArchitectureDocGenerator().generate_pdf_bytes()
+
+
+# Rendered once per process and kept in memory; the ETag only changes when the generator does
+architecture_doc = CachedDocument(
+    "architecture document",
+    render=render_architecture_doc,
+    fingerprint=source_fingerprint(os.path.join(os.path.dirname(__file__), "architecture_doc_generator.py")),
+)
+ARCHITECTURE_DOC_CACHE_CONTROL = os.getenv("ARCHITECTURE_DOC_CACHE_CONTROL", "public, max-age=3600")
+
+
 @app.get("/api/download-architecture-doc")
-async def download_architecture_doc():
-    """Generates and downloads the architecture document PDF."""
+async def download_architecture_doc(request: Request):
+    """Downloads the architecture document PDF (cached, supports conditional GET)."""
     try:
-        logger.info("Received request for architecture document.")
-        generator = ArchitectureDocGenerator()
-        pdf_file_path = generator.generate_architecture_doc()
-
-        if not os.path.exists(pdf_file_path):
-            logger.error(f"Generated PDF file not found after generation attempt: {pdf_file_path}")
-            raise HTTPException(status_code=500, detail="Failed to generate or locate architecture document.")
-
-        logger.info(f"Sending PDF file: {pdf_file_path}")
-        return FileResponse(
-            path=pdf_file_path,
-            filename="aeronautical_converter_architecture.pdf",
-            media_type='application/pdf'
-        )
+        document = await architecture_doc.get()
     except Exception as e:
-        logger.exception("Error generating or serving architecture document")
+        logger.exception("Error generating architecture document")
         raise HTTPException(status_code=500, detail=f"Error creating PDF: {str(e)}")
 
+    headers = {
+        "ETag": document.etag,
+        "Last-Modified": document.last_modified_header,
+        "Cache-Control": ARCHITECTURE_DOC_CACHE_CONTROL,
+    }
+    if is_not_modified(document, request.headers):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=document.content,
+        media_type="application/pdf",
+        headers={**headers, "Content-Disposition": 'attachment; filename="aeronautical_converter_architecture.pdf"'},
+    )
+
 # the __main__ block needed for local testing
 # if __name__ == "__main__":
 #     import uvicorn
@@ -11,7 +11,8 @@ class ArchitectureDocGenerator:
         self.pdf.set_auto_page_break(auto=True, margin=15)
         self.pdf.add_page()
         
-    def generate_architecture_doc(self):
+    def build_document(self):
+        """Lays out the whole document on self.pdf."""
         # Set up the document
         self.pdf.set_font("Arial", "B", 16)
         self.pdf.cell(0, 10, "Aeronautical Schedule Converter", ln=True, align="C")
@@ -157,7 +158,14 @@ class ArchitectureDocGenerator:
         
         This architecture ensures scalability, reliability, and security while maintaining high performance.
         """)
-        
+
+    def generate_pdf_bytes(self) -> bytes:
+        """Renders the document in memory, without touching the filesystem."""
+        self.build_document()
+        return bytes(self.pdf.output())
+
+    def generate_architecture_doc(self):
+        self.build_document()
         output_dir = "/tmp"
         os.makedirs(output_dir, exist_ok=True)
         output_path = os.path.join(output_dir, "architecture_document.pdf")
@@ -0,0 +1,90 @@
+"""
+Prompt packing for /api/convert/batch.
+
+Several schedule texts share one copy of the few-shot prompt: inputs are numbered,
+the model is asked to answer each under a "### ITEM <n>" marker, and the answer is
+split back per item. Packs are sized against an output-token budget so a pack never
+runs into max_output_tokens.
+"""
+import re
+from typing import Dict, List, NamedTuple
+
+ITEM_MARKER_RE = re.compile(r"^\s*#{2,}\s*ITEM\s+(\d+)\s*#*\s*$", re.MULTILINE)
+
+BATCH_INSTRUCTIONS = """
+## BATCH MODE
+Convert EACH of the numbered inputs below independently, applying every rule above.
+For each input, first output a line `### ITEM <number>` exactly as given, then that input's `<aixm:timeInterval>` elements.
+Answer every item, in the given order, and output nothing else.
+
+"""
+
+
+class PackedItem(NamedTuple):
+    slot: int  # position inside the pack, used as the ITEM number
+    key: str   # caller's key for mapping results back
+    text: str
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap ~4 chars/token estimate; good enough for packing decisions."""
+    return max(1, len(text) // 4)
+
+
+def estimate_output_tokens(text: str, tokens_per_interval: int = 90) -> int:
+    """
+    Rough upper bound on the XML a schedule expands to: one timeInterval per time
+    slot per day group, plus exclusions and annotations.
+    """
+    slots = max(1, len(re.findall(r"\d{2}:?\d{2}\s*-\s*\d{2}:?\d{2}|H24", text, re.IGNORECASE)))
+    day_groups = max(1, len(re.findall(r"\b(?:MON|TUE|WED|THU|FRI|SAT|SUN)\b", text, re.IGNORECASE)))
+    exclusions = len(re.findall(r"\bEXC", text, re.IGNORECASE))
+    intervals = slots * min(day_groups, 7) + exclusions + 1
+    return intervals * tokens_per_interval + estimate_tokens(text)
+
+
+def pack_items(
+    items: List[PackedItem], output_token_budget: int, max_items: int
+) -> List[List[PackedItem]]:
+    """Greedily groups items into packs whose estimated output fits the budget."""
+    packs: List[List[PackedItem]] = []
+    current: List[PackedItem] = []
+    used = 0
+    for item in items:
+        cost = estimate_output_tokens(item.text)
+        if current and (used + cost > output_token_budget or len(current) >= max_items):
+            packs.append(current)
+            current, used = [], 0
+        current.append(PackedItem(len(current), item.key, item.text))
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def build_batch_prompt(prompt_prefix: str, pack: List[PackedItem]) -> str:
+    lines = [prompt_prefix.rstrip(), BATCH_INSTRUCTIONS]
+    for item in pack:
+        lines.append(f"### ITEM {item.slot}")
+        lines.append(f"Input Schedule Text: {item.text}")
+        lines.append("")
+    lines.append("Output:")
+    return "\n".join(lines)
+
+
+def split_batch_output(raw_text: str, pack_size: int) -> Dict[int, str]:
+    """Maps ITEM numbers to their raw output; out-of-range or repeated items are dropped."""
+    parts: Dict[int, str] = {}
+    repeated = set()
+    matches = list(ITEM_MARKER_RE.finditer(raw_text))
+    for index, match in enumerate(matches):
+        slot = int(match.group(1))
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(raw_text)
+        if slot >= pack_size:
+            continue
+        if slot in parts:
+            repeated.add(slot)
+        parts[slot] = raw_text[match.end():end]
+    for slot in repeated:
+        del parts[slot]
+    return parts
@@ -0,0 +1,104 @@
+"""
+Cold-start benchmark for the backend.
+
+Each run starts a fresh interpreter, times `import backend.app`, checks that the
+lazily loaded modules (Gemini SDK, fpdf) were not pulled in by the import, and then
+times the first request to /health, to /api/convert answered by the rule parser,
+to /api/convert answered by a (stubbed, zero-latency) model and to the PDF route.
+Medians over --runs are printed; the exit code is 1 if a lazy module was loaded at
+import or a --max-* budget is exceeded, so it can gate CI.
+
+Run from the repository root:
+    python -m backend.benchmarks.cold_start --runs 5 --max-import-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+LAZY_MODULES = ("google.generativeai", "fpdf")
+
+CHILD = r"""
+import asyncio, json, sys, time
+import httpx
+
+start = time.perf_counter()
+import backend.app
+import_ms = (time.perf_counter() - start) * 1000
+lazy_loaded = [name for name in LAZY_MODULES if name in sys.modules]
+
+async def first_requests():
+    timings = {}
+    async with httpx.AsyncClient(app=backend.app.app, base_url="http://cold-start") as client:
+        async def timed(name, method, url, **kwargs):
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            timings[name] = (time.perf_counter() - start) * 1000
+            assert response.status_code == 200, (name, response.status_code, response.text[:200])
+
+        await timed("health_ms", "GET", "/health")
+        await timed("convert_rules_ms", "POST", "/api/convert", json={"text": "MON-FRI: 0900-1700"})
+
+        start = time.perf_counter()
+        import google.generativeai
+        timings["sdk_import_ms"] = (time.perf_counter() - start) * 1000
+        from backend.benchmarks.load_test import StubModel
+        StubModel.latency = 0
+        google.generativeai.GenerativeModel = StubModel
+        await timed("convert_model_ms", "POST", "/api/convert", json={"text": "HJ O/R cold-start"})
+
+        await timed("pdf_ms", "GET", "/api/download-architecture-doc")
+    return timings
+
+print(json.dumps({"import_ms": import_ms, "lazy_loaded": lazy_loaded, **asyncio.run(first_requests())}))
+"""
+
+
+def run_once() -> Dict:
+    env = {**os.environ, "CONVERSION_CACHE_DB": "", "RULE_PARSER_ENABLED": "true"}
+    env.setdefault("GEMINI_API_KEY", "cold-start")
+    completed = subprocess.run(
+        [sys.executable, "-c", f"LAZY_MODULES = {LAZY_MODULES!r}\n{CHILD}"],
+        env={**env, "PYTHONWARNINGS": "ignore"},
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise SystemExit(f"Cold-start run failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time exceeds this")
+    parser.add_argument("--max-first-request-ms", type=float, help="fail if the median first rule-parser /api/convert exceeds this")
+    args = parser.parse_args()
+
+    runs: List[Dict] = [run_once() for _ in range(args.runs)]
+    metrics = [key for key in runs[0] if key.endswith("_ms")]
+    print("metric           | median ms | max ms")
+    medians = {}
+    for key in metrics:
+        values = [run[key] for run in runs]
+        medians[key] = statistics.median(values)
+        print(f"{key[:-3]:<16} | {medians[key]:>9.1f} | {max(values):>6.1f}")
+
+    failures = []
+    lazy_loaded = sorted({name for run in runs for name in run["lazy_loaded"]})
+    if lazy_loaded:
+        failures.append(f"imported at startup but should be lazy: {', '.join(lazy_loaded)}")
+    if args.max_import_ms and medians["import_ms"] > args.max_import_ms:
+        failures.append(f"import {medians['import_ms']:.0f} ms > budget {args.max_import_ms:.0f} ms")
+    if args.max_first_request_ms and medians["convert_rules_ms"] > args.max_first_request_ms:
+        failures.append(f"first request {medians['convert_rules_ms']:.0f} ms > budget {args.max_first_request_ms:.0f} ms")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
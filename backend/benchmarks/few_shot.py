@@ -0,0 +1,109 @@
+"""
+Evaluation of few-shot example selection against the full-examples prompt.
+
+The prompt's worked examples (backend/prompt_examples.py) are the eval set, taken
+leave-one-out: each example is converted with a prompt built from the other ones, so
+its own answer is never in the prompt. For every case the report shows which
+examples were selected, prompt size with all examples vs the selection, and how many
+of the case's features the selection demonstrates (out of those any remaining
+example demonstrates). Prompt assembly time is compared between str.format over the
+full template and concatenating the cached prefix with the input; the selection
+itself (tokenizing the input) is timed separately.
+
+With --live, each case is also sent to Gemini (GEMINI_API_KEY required) with both
+prompts; an answer counts as correct when its canonical timeIntervals equal the
+golden output's.
+
+Run from the repository root:
+    python -m backend.benchmarks.few_shot --k 3 --budget 1000 [--live]
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+from backend.batch import estimate_tokens
+from backend.few_shot import FewShotPromptBuilder, feature_signature, render_tail
+from backend.incremental import interval_keys
+from backend.prompt_examples import EXAMPLES
+
+
+def assembly_micros(build, texts: List[str], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            build(text)
+    return (time.perf_counter() - started) / (rounds * len(texts)) * 1e6
+
+
+async def live_answer(prompt: str) -> List[str]:
+    from backend.app import PRIMARY_GENERATION_CONFIG, PRIMARY_MODEL, call_model
+    from backend.aixm_normalizer import normalize_aixm_output
+
+    try:
+        return interval_keys(await call_model(PRIMARY_MODEL, PRIMARY_GENERATION_CONFIG, prompt, normalize_aixm_output))
+    except Exception as error:
+        print(f"  call failed: {error}")
+        return []
+
+
+async def run(args: argparse.Namespace) -> int:
+    from backend.app import PROMPT_RULES, prompt_template
+
+    print(f"{'case':<34} | {'selected':<60} | tokens full -> few-shot | features")
+    totals = {"full": 0, "selected": 0, "covered": 0, "coverable": 0}
+    correct = {"full": 0, "selected": 0}
+    for held_out, case in enumerate(EXAMPLES):
+        library = EXAMPLES[:held_out] + EXAMPLES[held_out + 1:]
+        builder = FewShotPromptBuilder(PROMPT_RULES, library, k=args.k, token_budget=args.budget)
+        selection = builder.select(case.input)
+        full_prompt, selected_prompt = builder.build_full(case.input), builder.build(case.input)
+        wanted = feature_signature(case.input)
+        available = frozenset().union(*(feature_signature(example.input) for example in library))
+        shown = frozenset().union(*(feature_signature(library[position].input) for position in selection))
+        full_tokens, selected_tokens = estimate_tokens(full_prompt), estimate_tokens(selected_prompt)
+        totals["full"] += full_tokens
+        totals["selected"] += selected_tokens
+        totals["covered"] += len(wanted & shown)
+        totals["coverable"] += len(wanted & available)
+        print(f"{case.name:<34} | {', '.join(builder.names(selection)):<60} | {full_tokens:>6} -> {selected_tokens:<6} "
+              f"({1 - selected_tokens / full_tokens:.0%} less) | {len(wanted & shown)}/{len(wanted & available)}")
+        if args.live:
+            golden = interval_keys(case.output)
+            for name, prompt in (("full", full_prompt), ("selected", selected_prompt)):
+                correct[name] += await live_answer(prompt) == golden
+
+    print(f"prompt tokens: {totals['full']} -> {totals['selected']} ({1 - totals['selected'] / totals['full']:.0%} less), "
+          f"feature coverage {totals['covered']}/{totals['coverable']}")
+    if args.live:
+        print(f"correct answers: full examples {correct['full']}/{len(EXAMPLES)}, selected {correct['selected']}/{len(EXAMPLES)}")
+
+    builder = FewShotPromptBuilder(PROMPT_RULES, EXAMPLES, k=args.k, token_budget=args.budget)
+    texts = [example.input for example in EXAMPLES]
+    selections = {text: builder.select(text) for text in texts}
+    print(f"assembly per prompt: str.format {assembly_micros(lambda text: prompt_template.format(text_input=text), texts, args.rounds):.1f} us, "
+          f"cached prefix + tail {assembly_micros(lambda text: builder.prefix(selections[text]) + render_tail(text), texts, args.rounds):.1f} us; "
+          f"example selection {assembly_micros(builder.select, texts, args.rounds):.1f} us")
+    return 1 if args.live and correct["selected"] < correct["full"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=int(os.getenv("FEW_SHOT_K", "3")))
+    parser.add_argument("--budget", type=int, default=int(os.getenv("FEW_SHOT_TOKEN_BUDGET", "1000")))
+    parser.add_argument("--rounds", type=int, default=2000, help="assembly timing rounds per input")
+    parser.add_argument("--live", action="store_true", help="also convert each case with Gemini using both prompts")
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["CONVERSION_CACHE_DB"] = ""
+    raise SystemExit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.INFO)
+    main()
@@ -0,0 +1,137 @@
+"""
+Load test for /api/convert against a stubbed Gemini model.
+
+Replaces genai.GenerativeModel with an async stand-in that sleeps for a fixed
+latency, then drives the ASGI app in-process at several concurrency levels and
+prints p50/p99 latency for /api/convert and for /health probes issued while the
+conversions are in flight (a blocked event loop shows up there first).
+
+Run from the repository root:
+    python -m backend.benchmarks.load_test --latency 0.5 --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+import httpx
+
+os.environ.setdefault("GEMINI_API_KEY", "load-test")
+os.environ.setdefault("CONVERSION_CACHE_DB", "")
+
+import google.generativeai as genai  # noqa: E402
+
+STUB_OUTPUT = """<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>ANY</aixm:day>
+    <aixm:startTime>0800</aixm:startTime>
+    <aixm:endTime>1700</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>"""
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    latency = 0.5
+
+    def __init__(self, model_name: str = "stub", generation_config=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return _StubResponse(STUB_OUTPUT)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _StubResponse(STUB_OUTPUT)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests_per_client: int):
+    convert_latencies: List[float] = []
+    health_latencies: List[float] = []
+    errors = 0
+    counter = iter(range(10 ** 9))
+
+    async def convert_client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            # Unique, non-grammar text so neither the rule parser nor the cache answers
+            text = f"HJ O/R load-test request {next(counter)} {time.perf_counter_ns()}"
+            start = time.perf_counter()
+            response = await client.post("/api/convert", json={"text": text})
+            convert_latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    async def health_probe(stop: asyncio.Event):
+        # Measured from when the probe was due, so event-loop stalls count against it
+        while not stop.is_set():
+            due = time.perf_counter() + 0.05
+            await asyncio.sleep(0.05)
+            await client.get("/health")
+            health_latencies.append(time.perf_counter() - due)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(health_probe(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(convert_client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    total = len(convert_latencies)
+    print(
+        f"{concurrency:>11} | {total:>8} | {total / elapsed:>8.1f} | "
+        f"{percentile(convert_latencies, 50) * 1000:>8.0f} | {percentile(convert_latencies, 99) * 1000:>8.0f} | "
+        f"{percentile(health_latencies, 50) * 1000:>10.1f} | {percentile(health_latencies, 99) * 1000:>10.1f} | {errors:>6}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.5, help="stubbed model latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    parser.add_argument("--max-concurrent", type=int, help="override MAX_CONCURRENT_LLM_CALLS")
+    parser.add_argument("--sync", action="store_true", help="stub generate_content_async with the blocking call, to compare")
+    args = parser.parse_args()
+
+    if args.max_concurrent:
+        os.environ["MAX_CONCURRENT_LLM_CALLS"] = str(args.max_concurrent)
+    StubModel.latency = args.latency
+    if args.sync:
+        StubModel.generate_content_async = lambda self, prompt, **kwargs: _completed(self.generate_content(prompt))
+    genai.GenerativeModel = StubModel
+
+    from backend.app import app, upstream_limiter
+
+    print(f"stub latency {args.latency * 1000:.0f} ms, upstream slots {upstream_limiter.max_concurrent}, queue {upstream_limiter.max_queue}")
+    print("concurrency | requests | req/s    | p50 ms   | p99 ms   | health p50 | health p99 | errors")
+    async with httpx.AsyncClient(app=app, base_url="http://load-test", timeout=None) as client:
+        for concurrency in args.concurrency:
+            await run_level(client, concurrency, args.requests)
+
+
+async def _completed(value):
+    return value
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.INFO)
+    asyncio.run(main())
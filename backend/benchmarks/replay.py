@@ -0,0 +1,181 @@
+"""
+Throughput, latency and correctness benchmark for /api/convert with a replayed model.
+
+genai.GenerativeModel is replaced by ReplayModel, which answers from a golden
+corpus: the worked examples in prompt_template (and, for LLM_OUTPUT_FORMAT=compact,
+the matching JSON answers in compact_prompt_template). Latency is drawn from a
+log-normal distribution per model, and a configurable share of calls raise errors or
+return malformed output. Requests are driven through the ASGI app at each
+concurrency level; the report shows throughput, p50/p95/p99 latency, how often the
+fallback model produced the answer, and how many answers differ from the golden
+XML. The exit code is 1 if any successful answer mismatches, so one run catches
+both performance and correctness regressions.
+
+The rule parser and conversion cache are disabled by default so every request
+exercises the model path (--rules / --cache re-enable them).
+
+Run from the repository root:
+    python -m backend.benchmarks.replay --concurrency 1 10 50 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from typing import Dict, List, NamedTuple
+
+import httpx
+
+from .load_test import percentile
+
+EXAMPLE_RE = re.compile(r"Input Schedule Text:\n(?P<input>.+?)\n\nOutput:\n(?P<output>.+?)\n\n---", re.DOTALL)
+COMPACT_EXAMPLE_RE = re.compile(r"^Input Schedule Text: (?P<input>.+)\nOutput: (?P<output>\[.+\])$", re.MULTILINE)
+
+
+class GoldenCase(NamedTuple):
+    text: str
+    aixm_xml: str
+
+
+def golden_corpus(prompt_template: str) -> List[GoldenCase]:
+    return [GoldenCase(match["input"].strip(), match["output"].strip()) for match in EXAMPLE_RE.finditer(prompt_template)]
+
+
+class _ReplayResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class ReplayModel:
+    """Stand-in for genai.GenerativeModel that replays canned answers keyed by input text."""
+
+    answers: Dict[str, str] = {}
+    compact_answers: Dict[str, str] = {}
+    latency: Dict[str, float] = {}  # median seconds per model name
+    default_latency = 0.8
+    sigma = 0.5
+    error_rate = 0.0
+    malformed_rate = 0.0
+    rng = random.Random(0)
+
+    def __init__(self, model_name: str = "replay", generation_config=None, **kwargs):
+        self.model_name = model_name
+
+    def _answer(self, prompt: str) -> str:
+        text = prompt.rpartition("Input Schedule Text:")[2].strip().split("\n", 1)[0].strip()
+        answers = self.compact_answers if "Output ONLY a JSON array" in prompt else self.answers
+        if text not in answers:
+            raise ValueError(f"No canned answer for {text!r}")
+        return answers[text]
+
+    async def generate_content_async(self, prompt, **kwargs):
+        median = self.latency.get(self.model_name, self.default_latency)
+        await asyncio.sleep(median * math.exp(self.rng.gauss(0, self.sigma)))
+        roll = self.rng.random()
+        if roll < self.error_rate:
+            raise RuntimeError("Injected upstream error")
+        answer = self._answer(prompt)
+        if roll < self.error_rate + self.malformed_rate:
+            # Cut off mid-element, as a truncated generation would be
+            return _ReplayResponse(answer[: len(answer) // 2])
+        return _ReplayResponse(answer)
+
+
+class LevelResult(NamedTuple):
+    concurrency: int
+    requests: int
+    seconds: float
+    latencies: List[float]
+    fallback: int
+    errors: int
+    mismatches: int
+
+
+async def run_level(client: httpx.AsyncClient, corpus: List[GoldenCase], concurrency: int, total: int) -> LevelResult:
+    latencies: List[float] = []
+    fallback = errors = mismatches = 0
+    picks = iter(random.Random(concurrency).choices(corpus, k=total))
+
+    async def worker():
+        nonlocal fallback, errors, mismatches
+        for case in picks:
+            start = time.perf_counter()
+            response = await client.post("/api/convert", json={"text": case.text})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+                continue
+            body = response.json()
+            # With model routing either model can be the fallback; the note says when one was
+            if "fallback model" in (body.get("note") or ""):
+                fallback += 1
+            if body["aixm_xml"].strip() != case.aixm_xml:
+                mismatches += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return LevelResult(concurrency, total, time.perf_counter() - started, latencies, fallback, errors, mismatches)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--primary-latency", type=float, default=0.8, help="median primary latency (s)")
+    parser.add_argument("--fallback-latency", type=float, default=0.5, help="median fallback latency (s)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls that raise")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of calls returning truncated output")
+    parser.add_argument("--rules", action="store_true", help="keep the rule parser enabled")
+    parser.add_argument("--cache", action="store_true", help="keep the conversion cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "replay")
+    os.environ["CONVERSION_CACHE_DB"] = ""
+    if not args.rules:
+        os.environ["RULE_PARSER_ENABLED"] = "false"
+    if not args.cache:
+        os.environ["CONVERSION_CACHE_SIZE"] = "0"
+
+    import google.generativeai as genai
+    from backend.app import FALLBACK_MODEL, PRIMARY_MODEL, app, prompt_template
+    from backend.compact_schedule import compact_prompt_template
+
+    corpus = golden_corpus(prompt_template)
+    ReplayModel.answers = {case.text: case.aixm_xml for case in corpus}
+    ReplayModel.compact_answers = {match["input"].strip(): match["output"] for match in COMPACT_EXAMPLE_RE.finditer(compact_prompt_template)}
+    ReplayModel.latency = {PRIMARY_MODEL: args.primary_latency, FALLBACK_MODEL: args.fallback_latency}
+    ReplayModel.sigma = args.sigma
+    ReplayModel.error_rate = args.error_rate
+    ReplayModel.malformed_rate = args.malformed_rate
+    ReplayModel.rng = random.Random(args.seed)
+    genai.GenerativeModel = ReplayModel
+
+    print(f"golden corpus: {len(corpus)} cases; latency median {args.primary_latency:.2f}s/{args.fallback_latency:.2f}s, sigma {args.sigma}; "
+          f"errors {args.error_rate:.0%}, malformed {args.malformed_rate:.0%}")
+    print("concurrency | requests | req/s    | p50 ms   | p95 ms   | p99 ms   | fallback | errors | mismatches")
+    mismatches = 0
+    async with httpx.AsyncClient(app=app, base_url="http://replay", timeout=None) as client:
+        for concurrency in args.concurrency:
+            result = await run_level(client, corpus, concurrency, args.requests)
+            answered = result.requests - result.errors
+            print(
+                f"{concurrency:>11} | {result.requests:>8} | {result.requests / result.seconds:>8.1f} | "
+                f"{percentile(result.latencies, 50) * 1000:>8.0f} | {percentile(result.latencies, 95) * 1000:>8.0f} | "
+                f"{percentile(result.latencies, 99) * 1000:>8.0f} | {result.fallback / max(1, answered):>8.1%} | "
+                f"{result.errors:>6} | {result.mismatches:>10}"
+            )
+            mismatches += result.mismatches
+    if mismatches:
+        print(f"CORRECTNESS REGRESSION: {mismatches} answers differ from the golden corpus")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.INFO)
+    asyncio.run(main())
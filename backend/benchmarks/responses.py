@@ -0,0 +1,108 @@
+"""
+Response size and serialization benchmark for the conversion endpoints.
+
+A /api/convert/batch payload is built from random AIP schedules (converted by the
+rule parser, so no model is involved). The report compares:
+- rendering that payload with the stdlib encoder (Starlette's JSONResponse, the old
+  default) and with orjson (ORJSONResponse, now the default);
+- bytes on the wire uncompressed, gzip and brotli, with compression time;
+- the batch endpoint end to end through the ASGI app for each Accept-Encoding,
+  checking that every compressed response decodes to the identical JSON.
+
+Run from the repository root:
+    python -m backend.benchmarks.responses --items 500 --rounds 50
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import random
+import time
+from typing import Callable
+
+import httpx
+
+from .load_test import percentile
+from .schedule_index import random_schedule
+
+
+def timed(function: Callable, rounds: int) -> float:
+    """Median milliseconds of rounds calls."""
+    durations = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+    return percentile(durations, 50)
+
+
+async def end_to_end(app, payload: dict, encoding: str, rounds: int):
+    """(median ms, bytes on the wire, decoded body) for one Accept-Encoding."""
+    durations, wire, body = [], 0, b""
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            response = await client.post("/api/convert/batch", json=payload, headers={"Accept-Encoding": encoding})
+            body = response.content
+            durations.append((time.perf_counter() - started) * 1000)
+            wire = response.num_bytes_downloaded
+            response.raise_for_status()
+    return percentile(durations, 50), wire, body
+
+
+async def run(args: argparse.Namespace) -> int:
+    import brotli
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    from backend.app import BatchRequest, app, convert_batch
+
+    rng = random.Random(args.seed)
+    payload = {"items": [{"id": f"SVC-{n}", "text": random_schedule(rng)} for n in range(args.items)]}
+    content = (await convert_batch(BatchRequest(**payload))).model_dump(mode="json")
+
+    stdlib_ms = timed(lambda: JSONResponse(content).body, args.rounds)
+    orjson_ms = timed(lambda: ORJSONResponse(content).body, args.rounds)
+    body = ORJSONResponse(content).body
+    print(f"payload: {args.items} items, {len(body) / 1024:.0f} KiB of JSON")
+    print(f"serialization | stdlib json {stdlib_ms:.2f} ms | orjson {orjson_ms:.2f} ms | {stdlib_ms / orjson_ms:.1f}x faster")
+
+    gzip_level, brotli_quality = int(os.getenv("GZIP_LEVEL", "6")), int(os.getenv("BROTLI_QUALITY", "4"))
+    print("encoding | bytes    | ratio  | compress ms")
+    print(f"identity | {len(body):>8} | {1:>5.1f}x | {0:>11.2f}")
+    for name, compress in (
+        ("gzip", lambda: gzip.compress(body, gzip_level)),
+        ("br", lambda: brotli.compress(body, quality=brotli_quality)),
+    ):
+        size = len(compress())
+        print(f"{name:<8} | {size:>8} | {len(body) / size:>5.1f}x | {timed(compress, args.rounds):>11.2f}")
+
+    print("end to end   | p50 ms   | bytes on wire")
+    baseline = None
+    mismatches = 0
+    for encoding in ("identity", "gzip", "br"):
+        median, wire, decoded = await end_to_end(app, payload, encoding, args.rounds)
+        baseline = decoded if baseline is None else baseline
+        mismatches += decoded != baseline
+        print(f"{encoding:<12} | {median:>8.1f} | {wire:>8}")
+    if mismatches:
+        print(f"CORRECTNESS REGRESSION: {mismatches} compressed responses decode differently")
+    return 1 if mismatches else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500, help="batch items (max BATCH_MAX_ITEMS)")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["CONVERSION_CACHE_DB"] = ""
+    raise SystemExit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.INFO)
+    main()
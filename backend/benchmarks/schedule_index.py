@@ -0,0 +1,156 @@
+"""
+Benchmark of the compiled schedule index against naive XML evaluation.
+
+Builds a fleet of services from randomly combined AIP schedule phrases (converted by
+the rule parser, so no model is involved) plus the prompt's golden examples, then
+answers "which services are open at T" for random instants of the year twice: by
+re-reading every service's <aixm:Timesheet> XML (the naive way) and through
+ScheduleIndex. Both answers must agree; the exit code is 1 on any difference.
+Window queries ("open at some point in / throughout [T, T + window)") are timed on
+the index and spot-checked minute by minute against the naive evaluator.
+
+Run from the repository root:
+    python -m backend.benchmarks.schedule_index --services 5000 --queries 200
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+from typing import List, Set, Tuple
+
+from backend.aixm_xml import Timesheet, read_timesheets
+from backend.canonicalize import DAY_GROUPS, WEEK
+from backend.schedule_parser import convert_with_rules
+
+DAYS = ["MON-FRI", "SAT, SUN", "DAILY", "TUE-THU", "FRI-MON", "MON", "WEEKDAYS", "SAT"]
+SLOTS = ["0800-1700", "2200-0600", "H24", "0600-1200, 1300-1800", "0530-2130", "1900-0100", "0000-2400"]
+SEASONS = ["", "SUM: ", "WIN: ", "01 APR-30 SEP: ", "01 NOV-31 MAR: "]
+EXCEPTIONS = ["", "", " EXC HOL", " EXC 25 DEC", " EXC 24 DEC, 31 DEC"]
+
+
+def random_schedule(rng: random.Random) -> str:
+    parts = [f"{rng.choice(SEASONS)}{rng.choice(DAYS)} {rng.choice(SLOTS)}"]
+    if rng.random() < 0.3:
+        parts.append(f"HOL {rng.choice(SLOTS[:2])}")
+    return "; ".join(parts) + rng.choice(EXCEPTIONS)
+
+
+def _applies(sheet: Timesheet, date: datetime.date, holidays: Set[datetime.date]) -> bool:
+    start = int(sheet.start_date[3:]) * 100 + int(sheet.start_date[:2])
+    end = int(sheet.end_date[3:]) * 100 + int(sheet.end_date[:2])
+    mmdd = date.month * 100 + date.day
+    if not (start <= mmdd <= end if start <= end else mmdd >= start or mmdd <= end):
+        return False
+    one_day = datetime.timedelta(days=1)
+    if sheet.day == "HOL":
+        return date in holidays
+    if sheet.day == "BEF_HOL":
+        return date + one_day in holidays
+    if sheet.day == "AFT_HOL":
+        return date - one_day in holidays
+    weekday = WEEK[date.weekday()]
+    if sheet.day_til:
+        first, last = WEEK.index(sheet.day), WEEK.index(sheet.day_til)
+        return (WEEK.index(weekday) - first) % 7 <= (last - first) % 7
+    return weekday in DAY_GROUPS.get(sheet.day, {sheet.day})
+
+
+def naive_is_open(aixm_xml: str, when: datetime.datetime, holidays: Set[datetime.date]) -> bool:
+    """Reference evaluation straight from the XML, one service and one instant at a time."""
+    minute = when.hour * 60 + when.minute
+    today, yesterday = when.date(), when.date() - datetime.timedelta(days=1)
+    opened = closed = False
+    for sheet in read_timesheets(aixm_xml):
+        if sheet.start_time is None:
+            if sheet.note is not None:
+                continue
+            start, end = 0, 1440
+        else:
+            start = int(sheet.start_time[:2]) * 60 + int(sheet.start_time[3:])
+            end = int(sheet.end_time[:2]) * 60 + int(sheet.end_time[3:])
+        if end > start:
+            hit = start <= minute < end and _applies(sheet, today, holidays)
+        else:
+            hit = (minute >= start and _applies(sheet, today, holidays)) or (minute < end and _applies(sheet, yesterday, holidays))
+        if hit:
+            closed = closed or sheet.excluded
+            opened = opened or not sheet.excluded
+    return opened and not closed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--services", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200, help="instant queries per evaluator")
+    parser.add_argument("--window-hours", type=float, default=6.0)
+    parser.add_argument("--year", type=int, default=datetime.date.today().year)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["CONVERSION_CACHE_DB"] = ""
+    import numpy as np
+
+    from backend.app import prompt_template
+    from backend.benchmarks.replay import golden_corpus
+    from backend.schedule_index import ScheduleIndex
+
+    rng = random.Random(args.seed)
+    holidays = {datetime.date(args.year, 1, 1), datetime.date(args.year, 5, 1), datetime.date(args.year, 12, 25), datetime.date(args.year, 12, 26)}
+    services: List[Tuple[str, str]] = [(f"GOLDEN-{n}", case.aixm_xml) for n, case in enumerate(golden_corpus(prompt_template))]
+    while len(services) < args.services:
+        aixm_xml = convert_with_rules(random_schedule(rng))
+        if aixm_xml is not None:
+            services.append((f"SVC-{len(services)}", aixm_xml))
+
+    started = time.perf_counter()
+    index = ScheduleIndex.build(services, holidays)
+    index.compile([args.year])
+    build_seconds = time.perf_counter() - started
+    print(f"{len(index)} services indexed ({len(index.unsupported)} unsupported, {len(index.annotated)} annotated), "
+          f"{index.pattern_count} distinct day patterns, built in {build_seconds:.2f}s")
+
+    year_start = datetime.datetime(args.year, 1, 1)
+    instants = [year_start + datetime.timedelta(minutes=rng.randrange(365 * 1440)) for _ in range(args.queries)]
+    indexed = [(service_id, aixm_xml) for service_id, aixm_xml in services if service_id not in index.unsupported]
+
+    started = time.perf_counter()
+    naive = [[naive_is_open(aixm_xml, when, holidays) for _, aixm_xml in indexed] for when in instants]
+    naive_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    compiled = [index.open_at(when) for when in instants]
+    index_seconds = time.perf_counter() - started
+
+    mismatches = sum(int((answer != np.array(expected)).sum()) for answer, expected in zip(compiled, naive))
+    print("evaluator | queries | ms/query  | speedup")
+    print(f"naive XML | {len(instants):>7} | {naive_seconds / len(instants) * 1000:>9.2f} | {1:>6.0f}x")
+    print(f"index     | {len(instants):>7} | {index_seconds / len(instants) * 1000:>9.3f} | {naive_seconds / index_seconds:>6.0f}x")
+
+    window = datetime.timedelta(hours=args.window_hours)
+    started = time.perf_counter()
+    for when in instants:
+        index.open_between(when, when + window, "any")
+        index.open_between(when, when + window, "all")
+    window_seconds = time.perf_counter() - started
+    print(f"index windows ({args.window_hours:g}h, any+all): {window_seconds / len(instants) * 1000:.3f} ms/query pair")
+
+    # Minute-by-minute spot check of window answers on a sample of services
+    sample = rng.sample(range(len(indexed)), min(50, len(indexed)))
+    for when in instants[:10]:
+        minutes = [when + datetime.timedelta(minutes=m) for m in range(int(window.total_seconds() // 60))]
+        any_open, all_open = index.open_between(when, when + window, "any"), index.open_between(when, when + window, "all")
+        for position in sample:
+            states = [naive_is_open(indexed[position][1], minute, holidays) for minute in minutes]
+            mismatches += int(any_open[position] != any(states)) + int(all_open[position] != all(states))
+
+    if mismatches:
+        print(f"CORRECTNESS REGRESSION: {mismatches} answers differ from naive XML evaluation")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    import logging
+
+    logging.disable(logging.INFO)
+    main()
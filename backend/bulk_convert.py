@@ -0,0 +1,221 @@
+"""
+Offline bulk conversion of AIP schedule extracts.
+
+Streams a CSV or JSONL file of (service id, schedule text) rows through the same
+conversion core as /api/convert and appends one JSON line per row to the output.
+Rows are handled in chunks: identical texts are converted once (within the chunk
+and, via the checkpoint database, across the whole run), unique texts fan out over
+a bounded async worker pool, and results are written in input order. After every
+chunk the number of rows written and the output byte offset are checkpointed, so an
+interrupted run resumes where it stopped.
+
+Run from the repository root:
+    python -m backend.bulk_convert extract.csv results.jsonl --id-field service_id --text-field schedule
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .conversion_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[str, str]  # (service id, schedule text)
+
+
+def read_rows(path: str, id_field: str, text_field: str) -> Iterator[Row]:
+    """Yields rows one at a time so memory stays flat regardless of file size."""
+    with open(path, newline="", encoding="utf-8") as handle:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            records = (json.loads(line) for line in handle if line.strip())
+        else:
+            records = csv.DictReader(handle)
+        for record in records:
+            yield str(record[id_field]), str(record[text_field] or "")
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """
+    SQLite file holding run progress plus converted results by text hash. Results
+    are kept per output form, so a rerun with --canonicalize flipped doesn't reuse
+    the other form.
+    """
+
+    def __init__(self, path: str, canonicalize: bool = False):
+        self.form = "canonical" if canonicalize else "raw"
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS progress (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " text_hash TEXT PRIMARY KEY, aixm_xml TEXT, note TEXT, source TEXT, error TEXT)"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        # The connection autocommits; writes that must land together are grouped explicitly
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _key(self, text_hash: str) -> str:
+        return f"{text_hash}:{self.form}"
+
+    def get(self, name: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM progress WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def save_progress(self, **values):
+        with self._transaction():
+            self.db.executemany(
+                "INSERT OR REPLACE INTO progress (name, value) VALUES (?, ?)",
+                [(name, str(value)) for name, value in values.items()],
+            )
+
+    def lookup(self, text_hash: str) -> Optional[Dict]:
+        row = self.db.execute(
+            "SELECT aixm_xml, note, source, error FROM results WHERE text_hash = ?", (self._key(text_hash),)
+        ).fetchone()
+        return dict(zip(("aixm_xml", "note", "source", "error"), row)) if row else None
+
+    def store(self, results: Dict[str, Dict]):
+        with self._transaction():
+            self.db.executemany(
+                "INSERT OR REPLACE INTO results (text_hash, aixm_xml, note, source, error) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self._key(text_hash), r["aixm_xml"], r["note"], r["source"], r["error"])
+                    for text_hash, r in results.items()
+                    if r["error"] is None  # failures are retried on the next run
+                ],
+            )
+
+
+async def convert_unique(texts: Dict[str, str], concurrency: int, canonicalize: bool) -> Dict[str, Dict]:
+    """Converts each unique text once using a fixed number of workers."""
+    from .app import apply_canonicalization, run_conversion
+    from .quota import Priority, upstream_priority
+
+    # Yields quota to interactive traffic and waits longer for it
+    upstream_priority.set(Priority.BULK)
+
+    queue: "asyncio.Queue[Tuple[str, str]]" = asyncio.Queue()
+    for item in texts.items():
+        queue.put_nowait(item)
+    results: Dict[str, Dict] = {}
+
+    async def worker():
+        while not queue.empty():
+            text_hash, text = queue.get_nowait()
+            try:
+                response = await run_conversion(text)
+                if canonicalize:
+                    response = apply_canonicalization(response)
+                results[text_hash] = {"aixm_xml": response.aixm_xml, "note": response.note, "source": response.source, "error": None}
+            except Exception as conversion_error:
+                logger.warning(f"Conversion failed: {conversion_error}")
+                results[text_hash] = {"aixm_xml": None, "note": None, "source": None, "error": str(conversion_error) or type(conversion_error).__name__}
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(texts)))))
+    return results
+
+
+async def run(args: argparse.Namespace):
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint.sqlite3"
+    if args.restart:
+        for path in (checkpoint_path, args.output):
+            if os.path.exists(path):
+                os.remove(path)
+    checkpoint = Checkpoint(checkpoint_path, args.canonicalize)
+
+    input_stat = os.stat(args.input)
+    input_signature = f"{os.path.abspath(args.input)}:{input_stat.st_size}:{int(input_stat.st_mtime)}"
+    rows_done = int(checkpoint.get("rows_done") or 0)
+    output_offset = int(checkpoint.get("output_offset") or 0)
+    if rows_done and checkpoint.get("input_signature") != input_signature:
+        raise SystemExit("Checkpoint belongs to a different input file; rerun with --restart")
+    if rows_done and checkpoint.get("form") not in (None, checkpoint.form):
+        raise SystemExit("Output so far was written with the other --canonicalize setting; rerun with --restart")
+
+    output = open(args.output, "a+b")
+    # Drop anything written after the last checkpoint (an interrupted chunk)
+    output.truncate(output_offset)
+    output.seek(output_offset)
+    if rows_done:
+        logger.info(f"Resuming after {rows_done} rows")
+
+    rows = read_rows(args.input, args.id_field, args.text_field)
+    for _ in range(rows_done):
+        next(rows, None)
+
+    started = time.time()
+    converted_texts = 0
+    while True:
+        chunk: List[Row] = [row for _, row in zip(range(args.chunk_size), rows)]
+        if not chunk:
+            break
+
+        chunk_results: Dict[str, Dict] = {}
+        todo: Dict[str, str] = {}
+        for _, text in chunk:
+            text_hash = text_key(text)
+            if text_hash in chunk_results or text_hash in todo:
+                continue
+            previous = checkpoint.lookup(text_hash)
+            if previous is not None:
+                chunk_results[text_hash] = previous
+            else:
+                todo[text_hash] = text
+        if todo:
+            fresh = await convert_unique(todo, args.concurrency, args.canonicalize)
+            checkpoint.store(fresh)
+            chunk_results.update(fresh)
+            converted_texts += len(todo)
+
+        for service_id, text in chunk:
+            record = {"id": service_id, "text": text, **chunk_results[text_key(text)]}
+            output.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        output.flush()
+        os.fsync(output.fileno())
+        rows_done += len(chunk)
+        checkpoint.save_progress(rows_done=rows_done, output_offset=output.tell(), input_signature=input_signature, form=checkpoint.form)
+        logger.info(f"{rows_done} rows written ({converted_texts} unique texts converted, {time.time() - started:.1f}s)")
+
+    output.close()
+    logger.info(f"Done: {rows_done} rows in {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSONL (.jsonl/.ndjson) file")
+    parser.add_argument("output", help="JSONL results file (appended to on resume)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8")))
+    parser.add_argument("--chunk-size", type=int, default=500, help="rows per checkpoint")
+    parser.add_argument("--checkpoint", help="checkpoint database (default: <output>.checkpoint.sqlite3)")
+    parser.add_argument("--canonicalize", action="store_true", help="merge per-day intervals")
+    parser.add_argument("--restart", action="store_true", help="discard checkpoint and output and start over")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
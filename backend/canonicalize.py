@@ -0,0 +1,127 @@
+"""
+Interval canonicalization: collapses per-day expansions into minimal timesheets.
+
+Timesheets that differ only in their day are merged: their day sets are unioned and
+re-covered with as few entries as possible using ANY, WORK_DAY, WEEKEND and (when
+allowed) day/dayTil ranges. Exact duplicates disappear in the process and the
+result is sorted deterministically. Day-group semantics follow prompt_template
+(MON-FRI == WORK_DAY, SAT-SUN == WEEKEND, MON-SUN == ANY); HOL is never merged
+into other codes.
+"""
+from dataclasses import astuple, replace
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from .aixm_xml import Timesheet, read_timesheets, render_time_intervals
+
+WEEK = ("MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN")
+DAY_GROUPS = {
+    "ANY": frozenset(WEEK),
+    "WORK_DAY": frozenset(WEEK[:5]),
+    "WEEKEND": frozenset(WEEK[5:]),
+}
+# Canonical output order of day codes
+DAY_ORDER = {code: index for index, code in enumerate(("ANY", "WORK_DAY", "WEEKEND") + WEEK + ("HOL",))}
+
+DayEntry = Tuple[str, Optional[str]]  # (day, dayTil)
+
+
+class CanonicalizationReport(NamedTuple):
+    intervals_before: int
+    intervals_after: int
+
+    @property
+    def removed(self) -> int:
+        return self.intervals_before - self.intervals_after
+
+
+def _expand_days(sheet: Timesheet) -> Optional[FrozenSet[str]]:
+    """Weekdays covered by a timesheet; None for codes that must stay as they are (HOL, none)."""
+    if sheet.day in DAY_GROUPS and not sheet.day_til:
+        return DAY_GROUPS[sheet.day]
+    if sheet.day in WEEK:
+        if not sheet.day_til:
+            return frozenset([sheet.day])
+        if sheet.day_til in WEEK:
+            start, end = WEEK.index(sheet.day), WEEK.index(sheet.day_til)
+            return frozenset(WEEK[(start + n) % 7] for n in range((end - start) % 7 + 1))
+    return None
+
+
+def _runs(days: FrozenSet[str], use_ranges: bool) -> List[DayEntry]:
+    """Covers days (MON..SUN order, no wrap-around) with single days or day/dayTil runs."""
+    entries: List[DayEntry] = []
+    run: List[str] = []
+    for day in WEEK + (None,):
+        if day in days:
+            run.append(day)
+            continue
+        if run:
+            if use_ranges and len(run) > 1:
+                entries.append((run[0], run[-1]))
+            else:
+                entries.extend((single, None) for single in run)
+            run = []
+    return entries
+
+
+def cover_days(days: FrozenSet[str], use_ranges: bool = True) -> List[DayEntry]:
+    """Fewest day entries whose union is exactly days; ties prefer the named groups."""
+    if days == DAY_GROUPS["ANY"]:
+        return [("ANY", None)]
+    grouped: List[DayEntry] = []
+    rest = days
+    for code in ("WORK_DAY", "WEEKEND"):
+        if DAY_GROUPS[code] <= rest:
+            grouped.append((code, None))
+            rest = rest - DAY_GROUPS[code]
+    grouped.extend(_runs(rest, use_ranges))
+    plain = _runs(days, use_ranges)
+    return plain if len(plain) < len(grouped) else grouped
+
+
+def _date_key(value: str) -> Tuple[int, int]:
+    day, _, month = value.partition("-")
+    return (int(month or 0), int(day or 0)) if day.isdigit() and month.isdigit() else (99, 99)
+
+
+def _sort_key(sheet: Timesheet):
+    return (
+        sheet.excluded,
+        _date_key(sheet.start_date),
+        _date_key(sheet.end_date),
+        DAY_ORDER.get(sheet.day or "", len(DAY_ORDER)),
+        sheet.start_time or "",
+        sheet.end_time or "",
+        sheet.note or "",
+    )
+
+
+def canonicalize_timesheets(sheets: List[Timesheet], use_ranges: bool = True) -> List[Timesheet]:
+    templates: Dict[tuple, Timesheet] = {}
+    merged: Dict[tuple, FrozenSet[str]] = {}
+    kept: List[Timesheet] = []
+    for sheet in sheets:
+        days = _expand_days(sheet)
+        if days is None:
+            if sheet not in kept:
+                kept.append(sheet)
+            continue
+        # Everything except the day decides whether two timesheets can merge
+        template = replace(sheet, day=None, day_til=None)
+        key = astuple(template)
+        templates.setdefault(key, template)
+        merged[key] = merged.get(key, frozenset()) | days
+
+    result = list(kept)
+    for key, days in merged.items():
+        template = templates[key]
+        for day, day_til in cover_days(days, use_ranges):
+            result.append(replace(template, day=day, day_til=day_til))
+    return sorted(result, key=_sort_key)
+
+
+def canonicalize_xml(aixm_xml: str, use_ranges: bool = True) -> Tuple[str, CanonicalizationReport]:
+    """Canonicalizes a timeInterval fragment; raises ValueError if it can't be represented."""
+    sheets = read_timesheets(aixm_xml)
+    canonical = canonicalize_timesheets(sheets, use_ranges)
+    return render_time_intervals(canonical), CanonicalizationReport(len(sheets), len(canonical))
@@ -0,0 +1,178 @@
+"""
+Compact intermediate representation for model output.
+
+Instead of full AIXM XML the model answers with a short JSON array of rows, e.g.
+    [{"days": ["MON", "TUE"], "slots": [["07:00", "13:00"]], "dates": ["01-11", "31-03"]}]
+and expand_compact_output() turns it into the exact <aixm:timeInterval> layout that
+prompt_template specifies. Boilerplate (timeReference, default dates, wrappers,
+indentation) is never generated by the model, which cuts output tokens several-fold.
+"""
+import dataclasses
+import functools
+import json
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from .aixm_normalizer import NormalizationError
+from .aixm_xml import DEFAULT_END_DATE, DEFAULT_START_DATE, Timesheet, render_time_intervals
+
+logger = logging.getLogger(__name__)
+
+DAY_CODES = {"MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN", "WORK_DAY", "WEEKEND", "ANY", "HOL"}
+TIME_RE = re.compile(r"^(\d{2}):?(\d{2})$")
+DATE_RE = re.compile(r"^(\d{2})-?(\d{2})$")
+FENCE_RE = re.compile(r"```(?:json)?")
+
+compact_prompt_template = """
+You are an expert aeronautical information specialist system. Convert the 'Input Schedule Text' (an aeronautical service operational schedule) into a compact JSON description that will be expanded into AIXM 5.1.1 <aixm:timeInterval> elements.
+
+## OUTPUT FORMAT
+Output ONLY a JSON array. Each element is a row object with these keys:
+- "days": list of day codes the row applies to. Codes: MON, TUE, WED, THU, FRI, SAT, SUN, WORK_DAY, WEEKEND, ANY, HOL.
+- "slots": (optional) list of ["HH:MM", "HH:MM"] start/end time pairs, 24-hour clock. Omit for annotation-only rows and full-day exclusions.
+- "dates": (optional) ["DD-MM", "DD-MM"] start/end date. Omit when year-round.
+- "excluded": (optional) true only for periods when the service is explicitly NOT available.
+- "note": (optional) supplementary free text, copied verbatim.
+
+## INTERPRETATION RULES
+- "MON-FRI", "Weekdays" -> ["WORK_DAY"]. "SAT-SUN", "Weekends" -> ["WEEKEND"]. "Daily", "MON-SUN", "Every day" -> ["ANY"].
+- Other day ranges like "MON-THU" -> list each day: ["MON", "TUE", "WED", "THU"]. "HOL", "Public HOL" -> ["HOL"].
+- Times: "0800" -> "08:00". "H24" -> days ["ANY"] (unless days are given) with slot ["00:00", "24:00"]. Multiple time slots for the same days go in one row's "slots".
+- Dates use DD-MM ("Nov 1st" -> "01-11"). "WIN"/"Winter" -> ["01-11", "31-03"]. "SUM"/"Summer" -> ["01-04", "31-10"]. "SDLST" starts summer (01-04), "EDLST" ends it (31-10); "EDLST-SDLST" is winter.
+- "except HOL" -> add row {"days": ["HOL"], "excluded": true}. "except 01 JAN and 25 DEC" -> add one row per date: {"days": ["ANY"], "dates": ["01-01", "01-01"], "excluded": true}.
+- Free text like "PPR PN 2 HR", "See NOTAM", "O/R..." goes in "note" of the rows it applies to. If the input is ONLY an annotation (e.g. "ATS SKED"), output one row {"days": ["ANY"], "note": "<text>"}.
+- Use a separate row for each distinct combination of days, dates and exclusion status.
+
+## EXAMPLES
+Input Schedule Text: MON-FRI: 0900-1700
+Output: [{"days": ["WORK_DAY"], "slots": [["09:00", "17:00"]]}]
+
+Input Schedule Text: MON-THU: 0700-1300, 1400-1800
+Output: [{"days": ["MON", "TUE", "WED", "THU"], "slots": [["07:00", "13:00"], ["14:00", "18:00"]]}]
+
+Input Schedule Text: MON-FRI except HOL : SUM : 0600 - 2145 - WIN : 0700 - 2100.
+Output: [{"days": ["WORK_DAY"], "dates": ["01-04", "31-10"], "slots": [["06:00", "21:45"]]}, {"days": ["WORK_DAY"], "dates": ["01-11", "31-03"], "slots": [["07:00", "21:00"]]}, {"days": ["HOL"], "excluded": true}]
+
+Input Schedule Text: MON-SUN : 0800-1700. Extension possible: PPR PN 24 HR .
+Output: [{"days": ["ANY"], "slots": [["08:00", "17:00"]], "note": "Extension possible: PPR PN 24 HR ."}]
+
+Input Schedule Text: ATS SKED
+Output: [{"days": ["ANY"], "note": "ATS SKED"}]
+
+Input Schedule Text: {text_input}
+Output:"""
+
+
+class CompactRow(BaseModel):
+    days: List[str]
+    slots: List[Tuple[str, str]] = []
+    dates: Optional[Tuple[str, str]] = None
+    excluded: bool = False
+    note: Optional[str] = None
+
+    @field_validator("days")
+    @classmethod
+    def check_days(cls, days: List[str]) -> List[str]:
+        days = [day.strip().upper() for day in days]
+        unknown = [day for day in days if day not in DAY_CODES]
+        if not days or unknown:
+            raise ValueError(f"invalid day codes {unknown or days}")
+        return days
+
+    @field_validator("slots")
+    @classmethod
+    def check_slots(cls, slots: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        return [(_normalize_time(start), _normalize_time(end)) for start, end in slots]
+
+    @field_validator("dates")
+    @classmethod
+    def check_dates(cls, dates: Optional[Tuple[str, str]]) -> Optional[Tuple[str, str]]:
+        if dates is None:
+            return None
+        return _normalize_date(dates[0]), _normalize_date(dates[1])
+
+
+def _normalize_time(value: str) -> str:
+    # Same ranges as aixm_normalizer._check_values: 00:00-23:59, plus 24:00 for end of day
+    match = TIME_RE.match(value.strip())
+    hours, minutes = (int(match.group(1)), int(match.group(2))) if match else (99, 99)
+    if hours > 24 or minutes > 59 or (hours == 24 and minutes):
+        raise ValueError(f"invalid time {value!r}")
+    return f"{match.group(1)}:{match.group(2)}"
+
+
+def _normalize_date(value: str) -> str:
+    match = DATE_RE.match(value.strip())
+    if not match or not 1 <= int(match.group(1)) <= 31 or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"invalid date {value!r}")
+    return f"{match.group(1)}-{match.group(2)}"
+
+
+def build_compact_prompt(text: str) -> str:
+    # str.replace rather than str.format: the template is full of JSON braces
+    return compact_prompt_template.replace("{text_input}", text)
+
+
+@functools.lru_cache(maxsize=None)
+def json_mode_supported() -> bool:
+    """Whether the installed SDK can constrain output to JSON (warns once if not)."""
+    import google.generativeai as genai  # deferred: only needed once a model is actually called
+
+    supported = "response_mime_type" in {field.name for field in dataclasses.fields(genai.types.GenerationConfig)}
+    if not supported:
+        logger.warning(
+            f"google-generativeai {genai.__version__} has no response_mime_type; compact output is not "
+            "JSON-constrained and relies on the prompt, validation and repair retries"
+        )
+    return supported
+
+
+def compact_generation_config(generation_config: dict) -> dict:
+    """Adds JSON-constrained output where the installed SDK supports it."""
+    if json_mode_supported():
+        return {**generation_config, "response_mime_type": "application/json"}
+    return generation_config
+
+
+def parse_compact_rows(raw_text: str) -> List[CompactRow]:
+    """Parses and validates the model's JSON answer; raises NormalizationError if unusable."""
+    payload = FENCE_RE.sub("", raw_text).strip()
+    try:
+        data = json.loads(payload)
+    except json.JSONDecodeError as json_error:
+        raise NormalizationError(f"Compact output is not valid JSON: {json_error}") from json_error
+    if isinstance(data, dict) and isinstance(data.get("rows"), list):
+        data = data["rows"]
+    if not isinstance(data, list) or not data:
+        raise NormalizationError("Compact output must be a non-empty JSON array of rows")
+    try:
+        return [CompactRow.model_validate(row) for row in data]
+    except ValidationError as validation_error:
+        raise NormalizationError(f"Compact output failed validation: {validation_error}") from validation_error
+
+
+def expand_rows(rows: List[CompactRow]) -> List[Timesheet]:
+    """One timesheet per day per slot, in row order, matching the prompt's examples."""
+    sheets = []
+    for row in rows:
+        start_date, end_date = row.dates or (DEFAULT_START_DATE, DEFAULT_END_DATE)
+        for day in row.days:
+            for start_time, end_time in row.slots or [(None, None)]:
+                sheets.append(Timesheet(
+                    start_date=start_date,
+                    end_date=end_date,
+                    day=day,
+                    start_time=start_time,
+                    end_time=end_time,
+                    excluded=row.excluded,
+                    note=row.note,
+                ))
+    return sheets
+
+
+def expand_compact_output(raw_text: str) -> str:
+    """Model JSON answer -> <aixm:timeInterval> XML with deterministic 2-space formatting."""
+    return render_time_intervals(expand_rows(parse_compact_rows(raw_text)))
@@ -0,0 +1,139 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+CompressionMiddleware encodes response bodies with brotli or gzip, whichever the
+client ranks higher (brotli on ties, and only when the Brotli package is installed).
+Bodies under minimum_size, responses that already carry a Content-Encoding, and
+content types listed in excluded_types pass through untouched: event streams must
+reach the client event by event, and gzip archives or PDFs don't shrink further.
+Streamed bodies are compressed chunk by chunk as they are sent.
+"""
+import zlib
+from typing import Dict, Optional, Sequence
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+EXCLUDED_TYPES = ("text/event-stream", "application/gzip", "application/pdf", "image/")
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Content codings with their q-values from an Accept-Encoding header."""
+    accepted = {}
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip()] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """"br", "gzip" or None (identity) for an Accept-Encoding header."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Encoder:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        excluded_types: Sequence[str] = EXCLUDED_TYPES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_types = tuple(excluded_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or content_type.startswith(self.excluded_types) or message["status"] in (204, 304):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # held until the first body chunk shows whether compression pays off
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                headers = [(name, value) for name, value in start.get("headers", []) if name.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode("latin-1")), (b"vary", b"Accept-Encoding")]
+                if not more_body:
+                    compressed = encoder.compress(body) + encoder.finish()
+                    headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send({**start, "headers": headers})
+            compressed = encoder.compress(body)
+            if not more_body:
+                await send({"type": "http.response.body", "body": compressed + encoder.finish()})
+            elif compressed:
+                await send({"type": "http.response.body", "body": compressed, "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
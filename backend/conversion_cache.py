@@ -0,0 +1,188 @@
+"""
+Content-addressed cache for schedule conversions.
+
+Two tiers: an in-process LRU (size + TTL eviction) in front of a SQLite file that
+survives restarts and is shared by every uvicorn worker on the host. Async callers
+use aget()/aset(), which do the SQLite I/O in a worker thread so a busy database
+never blocks the event loop. Rows past db_ttl_seconds are deleted by a write at
+most every purge_interval seconds. Keys hash the
+normalized input together with a fingerprint of everything that shapes the model
+output (model names, generation configs, prompt template), so editing the prompt
+or switching models silently invalidates old entries.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CachedResult = Tuple[str, Optional[str]]  # (aixm_xml, note)
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different pastes share an entry."""
+    return " ".join(text.split())
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable sha256 over JSON-serializable parts (dict keys sorted)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ConversionCache:
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        db_path: Optional[str] = None,
+        db_ttl_seconds: float = 30 * 24 * 3600,
+        purge_interval: float = 3600,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_ttl_seconds = db_ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, CachedResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Separate lock for SQLite, so memory hits never wait behind a disk read or write
+        self._db_lock = threading.Lock()
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0  # first write also clears what expired while the process was down
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            try:
+                self._db = self._open_db(db_path)
+                logger.info(f"Conversion cache using SQLite file {db_path}")
+            except sqlite3.Error as db_error:
+                logger.warning(f"Conversion cache disk tier disabled ({db_path}): {db_error}")
+
+    @staticmethod
+    def _open_db(db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS conversions ("
+            " key TEXT PRIMARY KEY,"
+            " aixm_xml TEXT NOT NULL,"
+            " note TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS conversions_by_age ON conversions (created_at)")
+        return db
+
+    def key(self, text: str) -> str:
+        return fingerprint(self.namespace, normalize_text(text))
+
+    def get(self, text: str) -> Optional[CachedResult]:
+        key, now = self.key(text), time.time()
+        result = self._memory_get(key, now)
+        if result is not None:
+            return result
+        return self._disk_result(key, self._db_get(key, now), now)
+
+    async def aget(self, text: str) -> Optional[CachedResult]:
+        """get() for async callers: a memory miss reads SQLite in a worker thread."""
+        key, now = self.key(text), time.time()
+        result = self._memory_get(key, now)
+        if result is not None:
+            return result
+        stored = await asyncio.to_thread(self._db_get, key, now) if self._db is not None else None
+        return self._disk_result(key, stored, now)
+
+    def set(self, text: str, aixm_xml: str, note: Optional[str] = None):
+        key, now = self.key(text), time.time()
+        with self._lock:
+            self._remember(key, (aixm_xml, note), now)
+        self._db_set(key, aixm_xml, note, now)
+
+    async def aset(self, text: str, aixm_xml: str, note: Optional[str] = None):
+        """set() for async callers: the SQLite write runs in a worker thread."""
+        key, now = self.key(text), time.time()
+        with self._lock:
+            self._remember(key, (aixm_xml, note), now)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, aixm_xml, note, now)
+
+    def _memory_get(self, key: str, now: float) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return result
+                del self._memory[key]
+        return None
+
+    def _disk_result(self, key: str, result: Optional[CachedResult], now: float) -> Optional[CachedResult]:
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, result, now)
+        return result
+
+    def _remember(self, key: str, result: CachedResult, now: float):
+        self._memory[key] = (now, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[CachedResult]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT aixm_xml, note FROM conversions WHERE key = ? AND created_at >= ?",
+                    (key, now - self.db_ttl_seconds),
+                ).fetchone()
+        except sqlite3.Error as db_error:
+            logger.warning(f"Conversion cache read failed: {db_error}")
+            return None
+        return (row[0], row[1]) if row else None
+
+    def _db_set(self, key: str, aixm_xml: str, note: Optional[str], now: float):
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO conversions (key, aixm_xml, note, created_at) VALUES (?, ?, ?, ?)",
+                    (key, aixm_xml, note, now),
+                )
+                # Expired rows are only filtered out on read, so they are deleted here now and then
+                if now >= self._next_purge:
+                    purged = self._db.execute("DELETE FROM conversions WHERE created_at < ?", (now - self.db_ttl_seconds,)).rowcount
+                    self._next_purge = now + self.purge_interval
+                    if purged:
+                        logger.info(f"Conversion cache purged {purged} expired entries")
+        except sqlite3.Error as db_error:
+            logger.warning(f"Conversion cache write failed: {db_error}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self._db is not None,
+                "namespace": self.namespace[:12],
+            }
@@ -0,0 +1,72 @@
+"""
+In-memory cache for generated downloads.
+
+A CachedDocument renders its bytes once, on first use, in a worker thread so the
+event loop keeps serving requests. Concurrent first requests share one render.
+Its content fingerprint (for the architecture PDF: a hash of the generator's
+source) is served as a weak ETag, which stays stable across restarts and replicas
+even though the rendered bytes embed a generation timestamp.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Mapping, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RenderedDocument(NamedTuple):
+    content: bytes
+    etag: str
+    last_modified: datetime
+
+    @property
+    def last_modified_header(self) -> str:
+        return format_datetime(self.last_modified, usegmt=True)
+
+
+def source_fingerprint(path: str) -> str:
+    """Hash of the source file that produces a document (read, not imported)."""
+    with open(path, "rb") as source:
+        return hashlib.sha256(source.read()).hexdigest()[:32]
+
+
+class CachedDocument:
+    def __init__(self, name: str, render: Callable[[], bytes], fingerprint: str):
+        self.name = name
+        self.etag = f'W/"{fingerprint}"'
+        self._render = render
+        self._current: Optional[RenderedDocument] = None
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> RenderedDocument:
+        if self._current is not None:
+            return self._current
+        async with self._lock:
+            current = self._current
+            if current is None:
+                started = datetime.now(timezone.utc)
+                content = await asyncio.to_thread(self._render)
+                # HTTP dates have one-second resolution
+                current = RenderedDocument(content, self.etag, started.replace(microsecond=0))
+                self._current = current
+                logger.info(f"Rendered {self.name} ({len(content)} bytes) in {(datetime.now(timezone.utc) - started).total_seconds():.2f}s")
+            return current
+
+
+def is_not_modified(document: RenderedDocument, headers: Mapping[str, str]) -> bool:
+    """Conditional GET check: If-None-Match takes precedence over If-Modified-Since."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as required for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or document.etag.removeprefix("W/") in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return document.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
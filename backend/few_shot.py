@@ -0,0 +1,123 @@
+"""
+Few-shot example selection for the conversion prompt.
+
+Every example in backend/prompt_examples.py is indexed once by its feature
+signature: the schedule constructs it demonstrates (day groups, day ranges, multiple
+slots, seasons, exclusions, annotations, annotation-only input, H24). A request's
+input gets the same signature, and FewShotPromptBuilder picks at most k examples
+that together cover its features. Features few examples share weigh more, ties go
+to the cheaper example, and the selection stays under a token budget. An input
+with nothing in common with the library still gets the library's first (plainest)
+example, so the model always sees the output layout.
+
+Prompts are assembled by concatenation: the rules plus a given selection of
+examples form a prefix that is built once and cached, and only the input tail is
+appended per request (no str.format over the whole template).
+"""
+import functools
+import math
+from typing import FrozenSet, List, Sequence, Tuple
+
+from .batch import estimate_tokens
+from .prompt_examples import PromptExample
+from .routing import analyze_schedule
+from .schedule_parser import DAY_RANGE_CODES, tokenize
+
+FEATURES = ("day_group", "day_range", "day_list", "multi_slot", "h24", "seasonal", "exclusion", "annotation", "annotation_only")
+
+
+def render_example(example: PromptExample) -> str:
+    return f"Input Schedule Text:\n{example.input}\n\nOutput:\n{example.output}\n\n---\n"
+
+
+def render_tail(text: str) -> str:
+    return f"\nInput Schedule Text: {text}\n\nOutput:\n"
+
+
+def feature_signature(text: str) -> FrozenSet[str]:
+    """Schedule constructs text uses, out of FEATURES."""
+    complexity = analyze_schedule(text)
+    tokens = tokenize(text)
+    features = set()
+    single_days = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.kind == "DAY" and i + 2 < len(tokens) and tokens[i + 1].kind == "DASH" and tokens[i + 2].kind == "DAY":
+            # Ranges with a day code of their own (MON-FRI, SAT-SUN) vs ranges the model expands per day
+            features.add("day_group" if (token.value, tokens[i + 2].value) in DAY_RANGE_CODES else "day_range")
+            i += 3
+            continue
+        if token.kind == "GROUP":
+            features.add("day_group")
+        elif token.kind == "H24":
+            features.add("h24")
+        single_days += token.kind == "DAY"
+        i += 1
+    if single_days > 1:
+        features.add("day_list")
+    if complexity.slots > 1:
+        features.add("multi_slot")
+    if complexity.seasons:
+        features.add("seasonal")
+    if complexity.exclusions:
+        features.add("exclusion")
+    if complexity.annotations:
+        features.add("annotation" if complexity.days or complexity.slots else "annotation_only")
+    return frozenset(features)
+
+
+class FewShotPromptBuilder:
+    def __init__(self, rules: str, examples: Sequence[PromptExample], k: int = 3, token_budget: int = 1000):
+        self.rules = rules
+        self.examples = list(examples)
+        self.k = k
+        self.token_budget = token_budget
+        self._blocks = [render_example(example) for example in self.examples]
+        self._costs = [estimate_tokens(block) for block in self._blocks]
+        self._features = [feature_signature(example.input) for example in self.examples]
+        # Rarity weight: a feature only one example shows is worth more than one most show
+        self._weights = {
+            feature: math.log(1 + len(self.examples) / count)
+            for feature in FEATURES
+            if (count := sum(feature in features for features in self._features))
+        }
+        self.full_prefix = rules + "".join(self._blocks)
+        self.prefix = functools.lru_cache(maxsize=None)(self._prefix)
+
+    def select(self, text: str) -> Tuple[int, ...]:
+        """Positions of the chosen examples, in library order."""
+        wanted = feature_signature(text) & self._weights.keys()
+        chosen: List[int] = []
+        budget = self.token_budget
+        covered = set()
+        while len(chosen) < self.k:
+            best, best_gain = None, 0.0
+            for position, features in enumerate(self._features):
+                if position in chosen or self._costs[position] > budget:
+                    continue
+                gain = sum(self._weights[feature] for feature in (features & wanted) - covered)
+                if gain > best_gain or (gain == best_gain and best is not None and self._costs[position] < self._costs[best]):
+                    best, best_gain = position, gain
+            if best is None:
+                break
+            chosen.append(best)
+            covered |= self._features[best]
+            budget -= self._costs[best]
+        if not chosen and self.examples:
+            chosen.append(0)
+        return tuple(sorted(chosen))
+
+    def _prefix(self, selection: Tuple[int, ...]) -> str:
+        return self.rules + "".join(self._blocks[position] for position in selection)
+
+    def names(self, selection: Tuple[int, ...]) -> List[str]:
+        return [self.examples[position].name for position in selection]
+
+    def build(self, text: str) -> str:
+        """Rules, the examples selected for text and the input tail."""
+        return self.prefix(self.select(text)) + render_tail(text)
+
+    def build_full(self, text: str) -> str:
+        """Rules, every example and the input tail; same text as prompt_template.format()."""
+        return self.full_prefix + render_tail(text)
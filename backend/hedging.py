@@ -0,0 +1,142 @@
+"""
+Deadline-aware hedged requests.
+
+The primary call gets a head start equal to a percentile of its recently observed
+latency. If it hasn't produced a valid answer by then, the fallback is launched in
+parallel; the first valid result wins and the other call is cancelled. Everything
+is bounded by an absolute per-request deadline.
+"""
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, NamedTuple, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations per model."""
+
+    def __init__(self, window: int = 200, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model_name: str, seconds: float):
+        self._samples[model_name].append(seconds)
+
+    def percentile(self, model_name: str, pct: float) -> Optional[float]:
+        """None until enough samples have been seen to trust the estimate."""
+        samples = self._samples.get(model_name)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            model_name: {
+                "count": len(samples),
+                "p50": self.percentile(model_name, 50) or 0.0,
+                "p90": self.percentile(model_name, 90) or 0.0,
+                "p99": self.percentile(model_name, 99) or 0.0,
+            }
+            for model_name, samples in self._samples.items()
+        }
+
+
+class HedgePolicy:
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        percentile: float = 90,
+        initial_delay: float = 4.0,
+        min_delay: float = 0.5,
+        max_delay: float = 8.0,
+    ):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    def delay_for(self, model_name: str) -> float:
+        observed = self.tracker.percentile(model_name, self.percentile)
+        if observed is None:
+            return self.initial_delay
+        return min(self.max_delay, max(self.min_delay, observed))
+
+
+class HedgeResult(NamedTuple):
+    winner: str
+    value: Any
+    hedged: bool  # True if the fallback was launched while the primary was still running
+
+
+async def hedged_call(
+    primary: Tuple[str, Callable[[], Awaitable[T]]],
+    fallback: Tuple[str, Callable[[], Awaitable[T]]],
+    hedge_delay: float,
+    timeout: float,
+    is_valid: Callable[[T], bool] = lambda value: True,
+    fatal_errors: Tuple[type, ...] = (),
+) -> HedgeResult:
+    """
+    Races primary against a delayed fallback. Invalid results only win if nothing
+    valid arrives; errors in fatal_errors from the primary abort without a fallback.
+    Raises asyncio.TimeoutError once the deadline passes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    hedge_at = loop.time() + hedge_delay
+    tasks: Dict["asyncio.Task[T]", str] = {asyncio.create_task(primary[1]()): primary[0]}
+    fallback_started = False
+    hedged = False
+    invalid: Optional[Tuple[str, T]] = None
+    last_error: Optional[BaseException] = None
+
+    def start_fallback():
+        nonlocal fallback_started
+        fallback_started = True
+        tasks[asyncio.create_task(fallback[1]())] = fallback[0]
+
+    try:
+        while tasks:
+            wait_until = deadline if fallback_started else min(deadline, hedge_at)
+            done, _ = await asyncio.wait(
+                tasks, timeout=max(0.0, wait_until - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                if fallback_started or loop.time() >= deadline:
+                    raise asyncio.TimeoutError(f"No model answered within {timeout:.1f}s")
+                logger.info(f"{primary[0]} slower than {hedge_delay:.2f}s hedge delay, launching {fallback[0]} in parallel")
+                hedged = True
+                start_fallback()
+                continue
+
+            for task in done:
+                model_name = tasks.pop(task)
+                try:
+                    value = task.result()
+                except Exception as call_error:
+                    logger.warning(f"Error with model {model_name}: {call_error}")
+                    if model_name == primary[0] and isinstance(call_error, fatal_errors) and not tasks:
+                        raise
+                    last_error = call_error
+                    continue
+                if is_valid(value):
+                    return HedgeResult(model_name, value, hedged)
+                logger.warning(f"Model {model_name} returned output that failed validation")
+                invalid = invalid or (model_name, value)
+
+            if not tasks and not fallback_started and loop.time() < deadline:
+                start_fallback()
+
+        if invalid is not None:
+            return HedgeResult(invalid[0], invalid[1], hedged)
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,154 @@
+"""
+Incremental re-conversion of an AIP extract against the previous AIRAC cycle.
+
+The previous cycle's results file is the manifest: one JSON line per service with
+its id, text (or text_hash) and conversion result, as written by bulk_convert or by
+this module. The new extract is diffed against it by normalized text hash. Services
+whose text is unchanged carry their previous result forward, and so does any added or
+modified service whose text some service already had. Only texts never converted
+before (plus previous failures) go through the conversion core. The output is in the
+same format and doubles as the next cycle's manifest.
+
+The change report lists added, removed and modified services. Modified services
+are split into those whose timeIntervals actually differ and those whose text changed
+without changing the converted schedule. Intervals are compared after
+canonicalization, so a reordered or re-merged but equivalent result doesn't count as
+a change.
+
+Run from the repository root:
+    python -m backend.incremental extract.csv previous.jsonl results.jsonl --report changes.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from .aixm_xml import read_timesheets, render_timesheet
+from .bulk_convert import convert_unique, read_rows, text_key
+from .canonicalize import canonicalize_timesheets
+from .streaming import split_time_intervals
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = ("aixm_xml", "note", "source", "error")
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+    """Previous results by service id, each with its text_hash."""
+    manifest = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            row["text_hash"] = row.get("text_hash") or text_key(row.get("text") or "")
+            manifest[str(row["id"])] = row
+    return manifest
+
+
+def interval_keys(aixm_xml: str) -> List[str]:
+    """Comparable form of each timeInterval: canonical Timesheets, else whitespace-normalized XML."""
+    if not aixm_xml:
+        return []
+    try:
+        return [render_timesheet(sheet) for sheet in canonicalize_timesheets(read_timesheets(aixm_xml))]
+    except ValueError:
+        return [" ".join(interval.split()) for interval in split_time_intervals(aixm_xml)]
+
+
+def diff_intervals(before: str, after: str) -> Tuple[List[str], List[str]]:
+    """(intervals only in before, intervals only in after)."""
+    old, new = Counter(interval_keys(before)), Counter(interval_keys(after))
+    return list((old - new).elements()), list((new - old).elements())
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    started = time.time()
+    manifest = load_manifest(args.previous)
+    known: Dict[str, Dict[str, Any]] = {}  # text hash -> previous successful result
+    for row in manifest.values():
+        if not row.get("error") and not args.force:
+            known.setdefault(row["text_hash"], {field: row.get(field) for field in RESULT_FIELDS})
+
+    # First pass: which texts have never been converted
+    todo: Dict[str, str] = {}
+    seen = set()
+    for service_id, text in read_rows(args.input, args.id_field, args.text_field):
+        text_hash = text_key(text)
+        seen.add(service_id)
+        if text_hash not in known:
+            todo.setdefault(text_hash, text)
+    logger.info(f"{len(seen)} services, {len(manifest)} in the previous cycle; converting {len(todo)} new texts")
+    converted = await convert_unique(todo, args.concurrency, args.canonicalize) if todo else {}
+    results = {**known, **converted}
+
+    # Second pass: write results in input order and classify every service
+    summary = Counter()
+    changes: List[Dict[str, Any]] = []
+    with open(args.output, "w", encoding="utf-8") as output:
+        for service_id, text in read_rows(args.input, args.id_field, args.text_field):
+            text_hash = text_key(text)
+            result = results[text_hash]
+            output.write(json.dumps({"id": service_id, "text": text, "text_hash": text_hash, **result}, ensure_ascii=False) + "\n")
+            previous = manifest.get(service_id)
+            if result["error"]:
+                summary["failed"] += 1
+                changes.append({"id": service_id, "change": "failed", "error": result["error"]})
+                continue
+            if previous is None:
+                summary["added"] += 1
+                changes.append({"id": service_id, "change": "added", "intervals_after": len(interval_keys(result["aixm_xml"]))})
+                continue
+            if previous["text_hash"] == text_hash and not previous.get("error") and not args.force:
+                summary["unchanged"] += 1
+                continue
+            removed, added = diff_intervals(previous.get("aixm_xml") or "", result["aixm_xml"] or "")
+            if removed or added:
+                summary["modified"] += 1
+                changes.append({"id": service_id, "change": "modified", "intervals_removed": removed, "intervals_added": added})
+            else:
+                summary["text_only"] += 1
+                changes.append({"id": service_id, "change": "text_only"})
+    for service_id in manifest.keys() - seen:
+        summary["removed"] += 1
+        changes.append({"id": service_id, "change": "removed", "intervals_before": len(interval_keys(manifest[service_id].get("aixm_xml")))})
+
+    report = {
+        "services": len(seen),
+        "previous_services": len(manifest),
+        "texts_converted": len(todo),
+        "seconds": round(time.time() - started, 1),
+        "summary": {change: summary[change] for change in ("unchanged", "added", "modified", "text_only", "removed", "failed")},
+        "changes": changes,
+    }
+    with open(args.report or f"{args.output}.changes.json", "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, ensure_ascii=False)
+    logger.info(f"Done in {report['seconds']}s: {report['summary']}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="new cycle's CSV or JSONL (.jsonl/.ndjson) extract")
+    parser.add_argument("previous", help="previous cycle's results JSONL (the manifest)")
+    parser.add_argument("output", help="JSONL results for this cycle (next cycle's manifest)")
+    parser.add_argument("--report", help="change report JSON (default: <output>.changes.json)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8")))
+    parser.add_argument("--canonicalize", action="store_true", help="merge per-day intervals in new conversions")
+    parser.add_argument("--force", action="store_true", help="reconvert every text (prompt or model changed); still reports changes")
+    args = parser.parse_args()
+    if os.path.abspath(args.output) == os.path.abspath(args.previous):
+        parser.error("output must not overwrite the previous manifest")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Asynchronous conversion jobs backed by a local SQLite queue.
+
+POST /api/jobs stores a job and its items and returns immediately; a JobWorker
+claims queued jobs, converts their items through the same core as /api/convert and
+records each result as it finishes, so GET /api/jobs/{id} can report progress. A
+claim is a lease that the worker renews as items complete: if the worker dies, the
+lease runs out and another worker picks the job up, skipping items already done.
+
+The worker runs inside the API process (see JOB_WORKER_IN_APP) or on its own:
+    python -m backend.jobs --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .concurrency import QueueFullError
+from .conversion_cache import normalize_text
+from .quota import QuotaExhaustedError
+
+logger = logging.getLogger(__name__)
+
+ITEM_FIELDS = ("item_id", "aixm_xml", "note", "source", "error")
+
+
+class JobStore:
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " canonicalize INTEGER NOT NULL,"
+            " total INTEGER NOT NULL,"
+            " completed INTEGER NOT NULL DEFAULT 0,"
+            " failed INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " worker TEXT,"
+            " lease_until REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            " job_id TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " item_id TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " aixm_xml TEXT, note TEXT, source TEXT, error TEXT,"
+            " PRIMARY KEY (job_id, position))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS job_items_pending ON job_items (job_id, done, position)")
+
+    @contextmanager
+    def _transaction(self):
+        # The connection autocommits; multi-statement writes are grouped explicitly
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def create(self, items: Sequence[Tuple[str, str]], canonicalize: bool = False) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "INSERT INTO jobs (id, status, canonicalize, total, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, int(canonicalize), len(items), now, now),
+            )
+            self._db.executemany(
+                "INSERT INTO job_items (job_id, position, item_id, text) VALUES (?, ?, ?, ?)",
+                [(job_id, position, item_id, text) for position, (item_id, text) in enumerate(items)],
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._db.execute(
+                "SELECT id, status, canonicalize, total, completed, failed, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            )
+            row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+    def results(self, job_id: str, after: int = -1, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Up to limit finished items past submission position after, in submission order.
+        Items finish out of order, so only those before the first unfinished item are
+        returned: a cursor taken from the last row never skips one that finishes later.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT position, item_id, aixm_xml, note, source, error FROM job_items"
+                " WHERE job_id = ? AND done = 1 AND position > ?"
+                " AND NOT EXISTS (SELECT 1 FROM job_items AS pending"
+                "  WHERE pending.job_id = ? AND pending.done = 0 AND pending.position < job_items.position)"
+                " ORDER BY position LIMIT ?",
+                (job_id, after, job_id, limit),
+            ).fetchall()
+        return [dict(zip(("position",) + ITEM_FIELDS, row)) for row in rows]
+
+    def iter_results(self, job_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Every finished item, paged so large jobs aren't loaded at once."""
+        after = -1
+        while True:
+            rows = self.results(job_id, after, page_size)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            after = rows[-1]["position"]
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Leases the oldest queued job, or a running one whose worker's lease ran out."""
+        now = time.time()
+        with self._transaction():
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                    (worker, now + lease_seconds, now, row[0]),
+                )
+        return self.get(row[0]) if row else None
+
+    def pending_items(self, job_id: str) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT position, text FROM job_items WHERE job_id = ? AND done = 0 ORDER BY position", (job_id,)
+            ).fetchall()
+
+    def record(self, job_id: str, positions: Sequence[int], result: Dict[str, Any], lease_seconds: float):
+        """Stores one conversion result for every position sharing its text and renews the lease."""
+        now = time.time()
+        with self._transaction():
+            # done = 0 guard: a worker whose lease was taken over must not count items twice
+            updated = self._db.executemany(
+                "UPDATE job_items SET done = 1, aixm_xml = ?, note = ?, source = ?, error = ?"
+                " WHERE job_id = ? AND position = ? AND done = 0",
+                [(result.get("aixm_xml"), result.get("note"), result.get("source"), result.get("error"), job_id, position) for position in positions],
+            ).rowcount
+            self._db.execute(
+                "UPDATE jobs SET completed = completed + ?, failed = failed + ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                (updated, updated if result.get("error") else 0, now + lease_seconds, now, job_id),
+            )
+
+    def renew(self, job_id: str, lease_seconds: float):
+        """Extends the lease while a worker waits out an upstream overload."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ?", (now + lease_seconds, now, job_id))
+
+    def finish(self, job_id: str, status: str = "done", error: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker = NULL, lease_until = NULL, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def release(self, job_id: str):
+        """Hands a job back to the queue (worker shutting down mid-job)."""
+        self.finish(job_id, status="queued")
+
+    def purge(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._transaction():
+            expired = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+            )]
+            self._db.executemany("DELETE FROM job_items WHERE job_id = ?", [(job_id,) for job_id in expired])
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+        return len(expired)
+
+
+class JobWorker:
+    def __init__(
+        self,
+        store: JobStore,
+        concurrency: int = 8,
+        parallel_jobs: int = 2,
+        lease_seconds: float = 300,
+        poll_interval: float = 2.0,
+        retention_seconds: float = 7 * 24 * 3600,
+    ):
+        self.store = store
+        self.concurrency = concurrency
+        self.parallel_jobs = parallel_jobs
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        """Wakes idle job loops right away instead of at the next poll."""
+        self._wakeup.set()
+
+    async def process(self, job: Dict[str, Any]):
+        from .app import apply_canonicalization, run_conversion
+
+        # Identical texts in a job are converted once
+        positions: Dict[str, List[int]] = {}
+        texts: Dict[str, str] = {}
+        for position, text in await asyncio.to_thread(self.store.pending_items, job["id"]):
+            key = normalize_text(text)
+            positions.setdefault(key, []).append(position)
+            texts.setdefault(key, text)
+        queue: "asyncio.Queue[str]" = asyncio.Queue()
+        for key in texts:
+            queue.put_nowait(key)
+
+        async def convert_items():
+            while not queue.empty():
+                key = queue.get_nowait()
+                try:
+                    response = await run_conversion(texts[key])
+                    if job["canonicalize"]:
+                        response = apply_canonicalization(response)
+                    result = {"aixm_xml": response.aixm_xml, "note": response.note, "source": response.source}
+                except (QueueFullError, QuotaExhaustedError) as overload_error:
+                    # Overload isn't a conversion failure: the item stays pending and is tried again
+                    logger.info(f"Job {job['id']} waiting {overload_error.retry_after}s for upstream capacity: {overload_error}")
+                    await asyncio.to_thread(self.store.renew, job["id"], self.lease_seconds)
+                    await asyncio.sleep(overload_error.retry_after)
+                    queue.put_nowait(key)
+                    continue
+                except Exception as conversion_error:
+                    logger.warning(f"Job {job['id']} item failed: {conversion_error}")
+                    result = {"error": str(conversion_error) or type(conversion_error).__name__}
+                await asyncio.to_thread(self.store.record, job["id"], positions[key], result, self.lease_seconds)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(convert_items() for _ in range(min(self.concurrency, len(texts)) or 1)))
+        await asyncio.to_thread(self.store.finish, job["id"])
+        logger.info(f"Job {job['id']} finished: {job['total']} items, {len(texts)} unique texts pending at claim, {time.perf_counter() - started:.1f}s")
+
+    async def _job_loop(self, stop: asyncio.Event):
+        while not stop.is_set():
+            job = await asyncio.to_thread(self.store.claim, self.worker_id, self.lease_seconds)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info(f"Claimed job {job['id']} ({job['total'] - job['completed']} of {job['total']} items left)")
+            try:
+                await self.process(job)
+            except asyncio.CancelledError:
+                # Shielded: the release must land even though this task is being cancelled
+                await asyncio.shield(asyncio.to_thread(self.store.release, job["id"]))
+                raise
+            except Exception as job_error:
+                logger.exception(f"Job {job['id']} failed")
+                await asyncio.to_thread(self.store.finish, job["id"], status="failed", error=str(job_error))
+
+    async def run(self, stop: asyncio.Event):
+        from .quota import Priority, upstream_priority
+
+        # Jobs queue behind interactive conversions for upstream quota
+        upstream_priority.set(Priority.BATCH)
+        purged = await asyncio.to_thread(self.store.purge, self.retention_seconds)
+        if purged:
+            logger.info(f"Purged {purged} expired jobs")
+        logger.info(f"Job worker {self.worker_id} started ({self.parallel_jobs} job slots, {self.concurrency} conversions per job)")
+        await asyncio.gather(*(self._job_loop(stop) for _ in range(self.parallel_jobs)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=os.getenv("JOBS_DB", "/tmp/conversion_jobs.sqlite3"))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("JOB_CONCURRENCY", "8")), help="conversions in flight per job")
+    parser.add_argument("--parallel-jobs", type=int, default=int(os.getenv("JOB_PARALLEL", "2")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    worker = JobWorker(JobStore(args.db), concurrency=args.concurrency, parallel_jobs=args.parallel_jobs)
+    try:
+        asyncio.run(worker.run(asyncio.Event()))
+    except KeyboardInterrupt:
+        logger.info("Job worker stopped; unfinished jobs were returned to the queue")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Dependency-free request metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms register themselves in a process-wide REGISTRY,
+which /metrics renders. stage() times one part of a conversion (rules, cache,
+prompt, queue, upstream, postprocess, ...): the duration is observed in the stage
+histogram and, when MetricsMiddleware is tracing the request, added to that
+request's Server-Timing header. Durations of stages that run more than once per
+request (retries, hedged calls) are summed in the header.
+"""
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric"):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Sample lines for render(), one per label set (and bucket)."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{self.name}_bucket{self._labels(key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+# HTTP layer (recorded by MetricsMiddleware)
+HTTP_REQUESTS = Counter("converter_http_requests_total", "HTTP requests by route, method and status.", ["endpoint", "method", "status"])
+HTTP_DURATION = Histogram("converter_http_request_duration_seconds", "HTTP request duration.", ["endpoint"])
+HTTP_IN_FLIGHT = Gauge("converter_http_requests_in_flight", "HTTP requests currently being served.", ["endpoint"])
+ERRORS = Counter("converter_errors_total", "Failed conversions by endpoint and error class.", ["endpoint", "error"])
+
+# Conversion pipeline
+STAGE_DURATION = Histogram("converter_stage_duration_seconds", "Time spent per conversion stage.", ["stage"])
+CONVERSIONS = Counter("converter_conversions_total", "Conversions by source (rules, cache, llm).", ["source"])
+CACHE_LOOKUPS = Counter("converter_cache_lookups_total", "Conversion cache lookups.", ["result"])
+MODEL_CALLS = Counter("converter_model_calls_total", "Upstream model calls by outcome.", ["model", "outcome"])
+MODEL_WINS = Counter("converter_model_answers_total", "Conversions answered per model; hedged=true if the fallback raced.", ["model", "hedged"])
+PROMPT_TOKENS = Histogram("converter_prompt_tokens", "Prompt tokens per upstream call.", ["model"], buckets=TOKEN_BUCKETS)
+OUTPUT_TOKENS = Histogram("converter_output_tokens", "Output tokens per upstream call.", ["model"], buckets=TOKEN_BUCKETS)
+UPSTREAM_IN_FLIGHT = Gauge("converter_upstream_calls_in_flight", "Upstream calls holding a limiter slot.")
+UPSTREAM_WAITING = Gauge("converter_upstream_calls_waiting", "Upstream calls queued for a limiter slot.")
+QUOTA_REJECTIONS = Counter("converter_quota_rejections_total", "Calls refused locally by the quota scheduler.", ["model", "reason"])
+QUOTA_BACKOFFS = Counter("converter_quota_backoffs_total", "Quota errors from the API that paused a model.", ["model"])
+QUOTA_QUEUED = Gauge("converter_quota_queued", "Calls waiting for quota.", ["model"])
+QUOTA_BACKOFF_REMAINING = Gauge("converter_quota_backoff_remaining_seconds", "Remaining back-off after a quota error.", ["model"])
+ROUTING_DECISIONS = Counter("converter_routing_decisions_total", "Model conversions by routing tier and routed model.", ["tier", "model"])
+ROUTED_DURATION = Histogram("converter_routed_conversion_seconds", "Model conversion latency by routing tier.", ["tier"])
+TRUNCATION_RETRIES = Counter("converter_truncation_retries_total", "Calls retried with a larger output budget after hitting max_output_tokens.", ["model"])
+COALESCED_REQUESTS = Counter("converter_coalesced_requests_total", "Requests that joined an identical in-flight conversion.")
+SINGLEFLIGHT_IN_FLIGHT = Gauge("converter_singleflight_in_flight", "Distinct conversions currently running upstream.")
+SINGLEFLIGHT_WAITERS = Gauge("converter_singleflight_waiters", "Requests awaiting an in-flight conversion, including the one that started it.")
+
+_trace: ContextVar[Optional[Dict[str, float]]] = ContextVar("metrics_trace", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    STAGE_DURATION.observe(seconds, stage=name)
+    trace = _trace.get()
+    if trace is not None:
+        trace[name] = trace.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def server_timing(trace: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in trace.items()]
+    return ", ".join(entries + [f"total;dur={total * 1000:.2f}"])
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route request counts, durations and in-flight
+    gauges. With server_timing=True the stages recorded while handling a request
+    are reported in its Server-Timing response header (not for streamed bodies,
+    whose headers go out before the work is done).
+    """
+
+    def __init__(self, app, routes: Sequence, server_timing: bool = False):
+        self.app = app
+        self.routes = routes
+        self.server_timing = server_timing
+
+    def _endpoint(self, scope) -> str:
+        # Route templates, not raw paths, keep label cardinality bounded
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        trace: Dict[str, float] = {}
+        token = _trace.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    header = server_timing(trace, time.perf_counter() - start)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUESTS.inc(endpoint=endpoint, method=scope["method"], status=status)
+            HTTP_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+            _trace.reset(token)
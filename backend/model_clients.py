@@ -0,0 +1,119 @@
+"""
+Process-wide Gemini client registry.
+
+google.generativeai is imported and configured on first use instead of at module
+load, so cold starts that never reach Gemini (health checks, rule-parser and cache
+hits) don't pay for it. One GenerativeModel is created per (model, generation
+config) and reused by every request.
+
+All models share one async gRPC client, i.e. one HTTP/2 channel to the API that
+multiplexes concurrent calls over a kept-alive connection. It is built on first use
+from the event loop (grpc.aio channels belong to the loop that created them), with
+keepalive pings so an idle connection isn't silently dropped between bursts, and
+aclose() shuts it down when the app stops.
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .conversion_cache import fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class ModelClients:
+    def __init__(self, api_key: str, keepalive_seconds: float = 300):
+        self._api_key = api_key
+        self._keepalive_seconds = keepalive_seconds
+        self._genai = None
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._async_client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _sdk(self):
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self._api_key)
+                    logger.info("Gemini API configured successfully.")
+                    self._genai = genai
+        return self._genai
+
+    def get(self, model_name: str, generation_config: Dict[str, Any]):
+        """The shared GenerativeModel for this model and config, created on first use."""
+        key = fingerprint(model_name, generation_config)
+        client = self._clients.get(key)
+        if client is None:
+            genai = self._sdk()
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = genai.GenerativeModel(model_name=model_name, generation_config=generation_config)
+                    self._clients[key] = client
+        self._share_transport(client)
+        return client
+
+    def _channel_options(self):
+        options = [("grpc.max_send_message_length", -1), ("grpc.max_receive_message_length", -1)]
+        if self._keepalive_seconds > 0:
+            options += [
+                ("grpc.keepalive_time_ms", int(self._keepalive_seconds * 1000)),
+                ("grpc.keepalive_timeout_ms", 20000),
+                ("grpc.keepalive_permit_without_calls", 1),
+            ]
+        return options
+
+    def _share_transport(self, model):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # built from a worker thread; attached on first use in the loop
+        if self._async_client is None or self._loop is not loop:
+            from google.ai import generativelanguage as glm
+            from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+                GenerativeServiceGrpcAsyncIOTransport,
+            )
+            from google.api_core.gapic_v1.client_info import ClientInfo
+            from google.auth import api_key
+
+            channel = GenerativeServiceGrpcAsyncIOTransport.create_channel(
+                credentials=api_key.Credentials(self._api_key),
+                options=self._channel_options(),
+            )
+            transport = GenerativeServiceGrpcAsyncIOTransport(
+                channel=channel,
+                client_info=ClientInfo(user_agent=f"genai-py/{self._sdk().__version__}"),
+            )
+            self._async_client = glm.GenerativeServiceAsyncClient(transport=transport)
+            self._loop = loop
+            logger.info(f"Opened shared Gemini channel (keepalive {self._keepalive_seconds:g}s)")
+        # GenerativeModel keeps its async client in _async_client; SDK 0.3.1 has no public setter
+        model._async_client = self._async_client
+
+    async def aclose(self):
+        """Closes the shared channel; a later call opens a new one."""
+        client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.transport.close()
+            logger.info("Closed shared Gemini channel")
+
+    async def warm_up(self, models: Iterable[Tuple[str, Dict[str, Any]]], ping: bool = False):
+        """
+        Imports the SDK and builds the clients in a worker thread; with ping, also
+        sends each model a one-token request so connection setup is paid up front.
+        """
+        models = list(models)
+        clients = await asyncio.to_thread(lambda: [self.get(name, config) for name, config in models])
+        for client in clients:
+            self._share_transport(client)
+        if ping:
+            for (model_name, _), client in zip(models, clients):
+                try:
+                    await client.generate_content_async("ping", generation_config={"max_output_tokens": 1})
+                except Exception as ping_error:
+                    logger.warning(f"Warm-up ping to {model_name} failed: {ping_error}")
+        logger.info(f"Warmed up {len(clients)} Gemini clients")
@@ -0,0 +1,188 @@
+"""
+Worked examples for the conversion prompt.
+
+Each example is an input the prompt rules cover and the exact output expected for
+it. prompt_template embeds all of them, in this order. The few-shot selector
+(backend/few_shot.py) picks the most relevant ones per request, and the replay
+benchmark uses them as its golden corpus. Outputs must follow the prompt's layout
+exactly (2-space indentation, one Timesheet per timeInterval).
+"""
+from typing import List, NamedTuple
+
+
+class PromptExample(NamedTuple):
+    name: str
+    input: str
+    output: str
+
+
+EXAMPLES: List[PromptExample] = [
+    PromptExample(
+        name="work_day_single_slot",
+        input="MON-FRI: 0900-1700",
+        output="""\
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>WORK_DAY</aixm:day>
+    <aixm:startTime>09:00</aixm:startTime>
+    <aixm:endTime>17:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>""",
+    ),
+    PromptExample(
+        name="day_range_multi_slot",
+        input="MON-THU: 0700-1300, 1400-1800",
+        output="""\
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>MON</aixm:day>
+    <aixm:startTime>07:00</aixm:startTime>
+    <aixm:endTime>13:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>MON</aixm:day>
+    <aixm:startTime>14:00</aixm:startTime>
+    <aixm:endTime>18:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>TUE</aixm:day>
+    <aixm:startTime>07:00</aixm:startTime>
+    <aixm:endTime>13:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>TUE</aixm:day>
+    <aixm:startTime>14:00</aixm:startTime>
+    <aixm:endTime>18:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>WED</aixm:day>
+    <aixm:startTime>07:00</aixm:startTime>
+    <aixm:endTime>13:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>WED</aixm:day>
+    <aixm:startTime>14:00</aixm:startTime>
+    <aixm:endTime>18:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>THU</aixm:day>
+    <aixm:startTime>07:00</aixm:startTime>
+    <aixm:endTime>13:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>THU</aixm:day>
+    <aixm:startTime>14:00</aixm:startTime>
+    <aixm:endTime>18:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>""",
+    ),
+    PromptExample(
+        name="seasonal_with_holiday_exclusion",
+        input="MON-FRI except HOL : SUM : 0600 - 2145 - WIN : 0700 - 2100.",
+        output="""\
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-04</aixm:startDate>
+    <aixm:endDate>31-10</aixm:endDate>
+    <aixm:day>WORK_DAY</aixm:day>
+    <aixm:startTime>06:00</aixm:startTime>
+    <aixm:endTime>21:45</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-11</aixm:startDate>
+    <aixm:endDate>31-03</aixm:endDate>
+    <aixm:day>WORK_DAY</aixm:day>
+    <aixm:startTime>07:00</aixm:startTime>
+    <aixm:endTime>21:00</aixm:endTime>
+  </aixm:Timesheet>
+</aixm:timeInterval>
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>HOL</aixm:day>
+    <aixm:excluded>YES</aixm:excluded>
+  </aixm:Timesheet>
+</aixm:timeInterval>""",
+    ),
+    PromptExample(
+        name="daily_with_annotation",
+        input="MON-SUN : 0800-1700. Extension possible: PPR PN 24 HR .",
+        output="""\
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>ANY</aixm:day>
+    <aixm:startTime>08:00</aixm:startTime>
+    <aixm:endTime>17:00</aixm:endTime>
+    <aixm:annotation>
+      <aixm:Note>Extension possible: PPR PN 24 HR .</aixm:Note>
+    </aixm:annotation>
+  </aixm:Timesheet>
+</aixm:timeInterval>""",
+    ),
+    PromptExample(
+        name="annotation_only",
+        input="ATS SKED",
+        output="""\
+<aixm:timeInterval>
+  <aixm:Timesheet>
+    <aixm:timeReference>UTC</aixm:timeReference>
+    <aixm:startDate>01-01</aixm:startDate>
+    <aixm:endDate>31-12</aixm:endDate>
+    <aixm:day>ANY</aixm:day>
+    <aixm:annotation>
+      <aixm:Note>ATS SKED</aixm:Note>
+    </aixm:annotation>
+  </aixm:Timesheet>
+</aixm:timeInterval>""",
+    ),
+]
@@ -0,0 +1,218 @@
+"""
+Per-model upstream quota scheduling.
+
+Each model has token buckets for requests per minute and tokens per minute. A call
+reserves one request plus its estimated tokens before it goes upstream and settles
+the estimate against actual usage afterwards. Calls that can't be admitted yet wait
+in a per-model queue ordered by priority (interactive, then batch, then bulk), for
+at most the priority's maximum wait. A full queue, a wait longer than that, or a
+model that is backing off after a quota error raises QuotaExhaustedError with a
+Retry-After estimate, so callers can answer 429 instead of calling Gemini.
+
+Buckets are per process: with several workers, divide the account's limits between them.
+"""
+import asyncio
+import bisect
+import itertools
+import logging
+import math
+import re
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+    BULK = 2
+
+
+# Set by entry points that aren't interactive (batch endpoint, bulk CLI, job worker)
+upstream_priority: ContextVar[Priority] = ContextVar("upstream_priority", default=Priority.INTERACTIVE)
+
+RETRY_DELAY_RE = re.compile(r"retry(?:_delay\s*\{\s*seconds:\s*|\s+in\s+|[- ]after:?\s*)(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when a call can't be admitted within the model's quota."""
+
+    def __init__(self, message: str, retry_after: float = 1, model_name: str = "", reason: str = "quota error"):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.model_name = model_name
+        self.reason = reason
+
+
+def is_quota_error(error: BaseException) -> bool:
+    # google.api_core.exceptions.ResourceExhausted (HTTP 429), matched by name so the SDK stays lazily imported
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or getattr(error, "code", None) == 429
+
+
+def retry_delay_hint(error: BaseException) -> Optional[float]:
+    """Server-suggested retry delay ("retry_delay { seconds: 20 }", "Retry in 20s"), if any."""
+    match = RETRY_DELAY_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # Requests larger than the bucket only need it full; the overdraft is paid back later
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _ModelState:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue: List[Tuple[int, int, asyncio.Event]] = []
+        self.backoff_until = 0.0
+        self.backoff_seconds = 0.0
+
+
+class Grant:
+    """An admitted call's token reservation."""
+
+    def __init__(self, state: _ModelState, reserved: int):
+        self._state = state
+        self.reserved = reserved
+
+    def settle(self, actual_tokens: int):
+        difference = actual_tokens - self.reserved
+        if difference > 0:
+            self._state.tokens.take(difference, time.monotonic())
+        else:
+            self._state.tokens.give_back(-difference)
+        self.reserved = actual_tokens
+
+
+class QuotaScheduler:
+    def __init__(
+        self,
+        limits: Mapping[str, Mapping[str, float]],
+        default_limits: Mapping[str, float],
+        max_queue: int = 64,
+        max_wait: Optional[Mapping[Priority, float]] = None,
+        backoff_initial: float = 2.0,
+        backoff_max: float = 60.0,
+    ):
+        self.limits = dict(limits)
+        self.default_limits = dict(default_limits)
+        self.max_queue = max_queue
+        self.max_wait = dict(max_wait or {Priority.INTERACTIVE: 10.0, Priority.BATCH: 30.0, Priority.BULK: 300.0})
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self._models: Dict[str, _ModelState] = {}
+        self._sequence = itertools.count()
+        self.rejected: Dict[str, int] = {}
+
+    def _state(self, model_name: str) -> _ModelState:
+        state = self._models.get(model_name)
+        if state is None:
+            limits = {**self.default_limits, **self.limits.get(model_name, {})}
+            state = self._models[model_name] = _ModelState(limits["rpm"], limits["tpm"])
+        return state
+
+    def _reject(self, model_name: str, reason: str, retry_after: float):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise QuotaExhaustedError(f"{model_name} quota: {reason}", retry_after, model_name, reason)
+
+    async def acquire(self, model_name: str, tokens: int, priority: Optional[Priority] = None) -> Grant:
+        """Waits (in priority order) until the call fits the model's budget; raises QuotaExhaustedError."""
+        priority = upstream_priority.get() if priority is None else priority
+        state = self._state(model_name)
+        max_wait = self.max_wait[priority]
+        now = time.monotonic()
+        if state.backoff_until - now > max_wait:
+            self._reject(model_name, "backing off after quota error", state.backoff_until - now)
+        if len(state.queue) >= self.max_queue:
+            self._reject(model_name, "queue full", max(1.0, state.backoff_until - now))
+
+        entry = (int(priority), next(self._sequence), asyncio.Event())
+        bisect.insort(state.queue, entry)
+        give_up_at = now + max_wait
+        try:
+            while True:
+                now = time.monotonic()
+                if state.queue[0] is entry:
+                    delay = max(
+                        state.backoff_until - now,
+                        state.requests.wait_time(1, now),
+                        state.tokens.wait_time(tokens, now),
+                    )
+                    if delay <= 0:
+                        state.requests.take(1, now)
+                        state.tokens.take(tokens, now)
+                        return Grant(state, tokens)
+                    if now + delay > give_up_at:
+                        self._reject(model_name, "budget exhausted", delay)
+                else:
+                    # Woken when it reaches the head of the queue
+                    delay = give_up_at - now
+                    if delay <= 0:
+                        self._reject(model_name, "budget exhausted", max_wait)
+                try:
+                    await asyncio.wait_for(entry[2].wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                entry[2].clear()
+        finally:
+            state.queue.remove(entry)
+            if state.queue:
+                state.queue[0][2].set()
+
+    def backoff(self, model_name: str, hint: Optional[float] = None) -> float:
+        """Records a quota error: pauses the model (server hint or exponential delay); returns the delay."""
+        state = self._state(model_name)
+        state.backoff_seconds = min(self.backoff_max, max(self.backoff_initial, state.backoff_seconds * 2))
+        delay = hint if hint else state.backoff_seconds
+        state.backoff_until = max(state.backoff_until, time.monotonic() + delay)
+        # The bucket overestimated what was left; don't let queued calls drain it after the pause
+        state.requests.level = min(state.requests.level, 0)
+        logger.warning(f"Quota error from {model_name}; backing off for {delay:.1f}s")
+        if state.queue:
+            state.queue[0][2].set()
+        return delay
+
+    def succeeded(self, model_name: str):
+        self._state(model_name).backoff_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        for state in self._models.values():
+            state.requests._refill(now)
+            state.tokens._refill(now)
+        return {
+            "models": {
+                model_name: {
+                    "queued": len(state.queue),
+                    "backoff_remaining": round(max(0.0, state.backoff_until - now), 1),
+                    "requests_available": round(state.requests.level, 1),
+                    "tokens_available": round(state.tokens.level),
+                }
+                for model_name, state in self._models.items()
+            },
+            "rejected": dict(self.rejected),
+        }
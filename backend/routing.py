@@ -0,0 +1,160 @@
+"""
+Complexity-aware routing of model conversions.
+
+analyze_schedule() reads the input with the rule parser's tokenizer and counts what
+drives the size of the answer: selected days, time slots, seasons/date ranges,
+exclusions and free-text annotations. From those it estimates how many
+<aixm:timeInterval> elements the answer holds. ModelRouter turns that into a routing
+decision: simple inputs (few intervals, no exclusions, no free text) go to the lite
+model, the rest to the standard one, and max_output_tokens is sized to the estimate
+with headroom instead of a flat 4096. Budgets are rounded up to powers of two so
+routed calls share a handful of model clients. An answer cut off at the budget
+raises OutputTruncatedError, and the caller retries with a larger budget.
+"""
+import math
+from typing import List, NamedTuple, Optional, Tuple
+
+from .schedule_parser import DAY_RANGE_CODES, WEEK, Token, tokenize
+
+
+class ScheduleComplexity(NamedTuple):
+    days: int  # day entries the model has to write (MON-FRI as WORK_DAY counts once)
+    slots: int
+    seasons: int  # seasons, date ranges and DST periods
+    exclusions: int
+    annotations: int  # runs of words outside the schedule grammar
+    estimated_intervals: int
+
+
+class RoutingDecision(NamedTuple):
+    tier: str  # "simple" | "standard"
+    model: str
+    fallback_model: str
+    max_output_tokens: int
+    complexity: Optional[ScheduleComplexity] = None  # None when routing is disabled
+
+
+class OutputTruncatedError(ValueError):
+    """The model stopped at max_output_tokens; the answer is incomplete."""
+
+    def __init__(self, model_name: str, max_output_tokens: int):
+        super().__init__(f"{model_name} output truncated at max_output_tokens={max_output_tokens}")
+        self.model_name = model_name
+        self.max_output_tokens = max_output_tokens
+
+
+def is_truncated(response) -> bool:
+    """True if the SDK response finished because of the output token limit."""
+    for candidate in getattr(response, "candidates", None) or []:
+        reason = getattr(candidate, "finish_reason", None)
+        if getattr(reason, "name", reason) in ("MAX_TOKENS", 2):
+            return True
+    return False
+
+
+def _segment_counts(tokens: List[Token]) -> Tuple[int, int]:
+    """(day entries, time slots) in one ';'-separated part of the schedule."""
+    days = slots = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        ranged = i + 2 < len(tokens) and tokens[i + 1].kind == "DASH" and tokens[i + 2].kind == token.kind
+        if token.kind == "DAY" and ranged:
+            pair = (token.value, tokens[i + 2].value)
+            days += 1 if pair in DAY_RANGE_CODES else (WEEK.index(pair[1]) - WEEK.index(pair[0])) % 7 + 1
+            i += 3
+        elif token.kind == "TIME" and ranged:
+            slots += 1
+            i += 3
+        else:
+            days += token.kind in ("DAY", "GROUP", "HOL")
+            slots += token.kind == "H24"
+            i += 1
+    return days, slots
+
+
+def analyze_schedule(text: str) -> ScheduleComplexity:
+    tokens = tokenize(text)
+    seasons = exclusions = annotations = 0
+    segments: List[List[Token]] = [[]]
+    excluding = in_words = False
+    for position, token in enumerate(tokens):
+        if token.kind == "WORD":
+            annotations += not in_words
+            in_words = True
+            excluding = False
+            continue
+        in_words = False
+        if token.kind == "EXCEPT":
+            excluding = True
+            continue
+        if excluding:
+            if token.kind in ("HOL", "DATE", "DAY"):
+                exclusions += 1
+                continue
+            if token.kind in ("SEP", "AND", "DASH"):
+                continue
+            excluding = False
+        if token.kind == "SEASON" or (token.kind == "DATE" and position + 1 < len(tokens) and tokens[position + 1].kind == "DASH") \
+                or (token.kind == "DST" and token.value == "SDLST"):
+            seasons += 1
+        if token.value == ";":
+            segments.append([])
+        else:
+            segments[-1].append(token)
+    counts = [_segment_counts(segment) for segment in segments]
+    days = sum(segment_days for segment_days, _ in counts)
+    slots = sum(segment_slots for _, segment_slots in counts)
+    # Each part of the schedule expands to one interval per day entry and slot
+    intervals = sum(max(1, segment_days) * max(1, segment_slots) for segment_days, segment_slots in counts if segment_days or segment_slots)
+    if annotations and not intervals:
+        # Free-text schedule: nothing to count, so assume a per-day expansion
+        intervals = len(WEEK)
+    estimated = max(1, intervals) + exclusions + (1 if annotations else 0)
+    return ScheduleComplexity(days, slots, seasons, exclusions, annotations, estimated)
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        standard_model: str,
+        simple_model: str,
+        simple_max_intervals: int = 2,
+        min_output_tokens: int = 256,
+        max_output_tokens: int = 8192,
+        headroom: float = 1.5,
+    ):
+        self.standard_model = standard_model
+        self.simple_model = simple_model
+        self.simple_max_intervals = simple_max_intervals
+        self.min_output_tokens = min_output_tokens
+        self.max_output_tokens = max_output_tokens
+        self.headroom = headroom
+
+    def budget(self, tokens: float) -> int:
+        """Smallest power of two covering tokens, clamped to [min_output_tokens, max_output_tokens]."""
+        rounded = 2 ** math.ceil(math.log2(max(1.0, tokens)))
+        return max(self.min_output_tokens, min(self.max_output_tokens, rounded))
+
+    def next_budget(self, current: int) -> int:
+        """Budget for a retry after truncation; equals current once the cap is reached."""
+        return self.budget(current * 2)
+
+    def route(self, text: str, tokens_per_interval: int) -> RoutingDecision:
+        complexity = analyze_schedule(text)
+        simple = (
+            complexity.estimated_intervals <= self.simple_max_intervals
+            and complexity.exclusions == 0
+            and complexity.annotations == 0
+            and complexity.seasons <= 1
+        )
+        # Annotation text is echoed into <aixm:Note>, so it counts against the budget too
+        expected = complexity.estimated_intervals * tokens_per_interval + (len(text) // 4 if complexity.annotations else 0)
+        model, fallback = (self.simple_model, self.standard_model) if simple else (self.standard_model, self.simple_model)
+        return RoutingDecision(
+            tier="simple" if simple else "standard",
+            model=model,
+            fallback_model=fallback,
+            max_output_tokens=self.budget(expected * self.headroom),
+            complexity=complexity,
+        )
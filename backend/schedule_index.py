@@ -0,0 +1,255 @@
+"""
+Compiled schedule index for "which services are open at T / during [T1, T2)" queries.
+
+Each service's <aixm:timeInterval> fragments are read once into Timesheets and
+compiled, per calendar year, into one day-pattern id per day of the year. A day
+pattern is a 1440-minute bitmap; patterns are shared by every service and day that
+has the same open minutes, so a few hundred of them usually cover thousands of
+services. A query then gathers pattern ids for all services at once and looks the
+minute up (instants) or sums open minutes from per-pattern prefix sums (windows),
+without touching XML.
+
+Semantics, as in the converter's output: startDate/endDate are DD-MM seasons and
+may wrap the year end; MON..SUN, day/dayTil ranges, ANY, WORK_DAY (MON-FRI) and
+WEEKEND select weekdays; HOL, BEF_HOL and AFT_HOL use the holiday dates the index
+was built with. Times are UTC, endTime 24:00 is end of day and an endTime at or
+before startTime runs past midnight into the next day. Excluded timesheets remove
+their minutes from whatever the others open. A timesheet without times covers the
+whole day, unless it only carries a note (O/R, HX, ...), which marks the service
+as annotated rather than open. Services using anything else (sunrise/sunset
+events, unknown day codes) are reported as unsupported and never match.
+"""
+import datetime
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from .aixm_xml import Timesheet, read_timesheets
+from .canonicalize import DAY_GROUPS, WEEK
+
+MINUTES_PER_DAY = 1440
+WINDOW_MODES = ("any", "all")
+
+
+class _Rule(NamedTuple):
+    season: Tuple[int, int]  # (MMDD start, MMDD end), may wrap
+    day: str
+    day_til: Optional[str]
+    start: int  # minutes from midnight
+    end: int
+    excluded: bool
+
+    @property
+    def overnight(self) -> bool:
+        return self.end <= self.start
+
+
+def _minutes(value: str) -> int:
+    hours, _, minutes = value.partition(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _mmdd(value: str) -> int:
+    day, _, month = value.partition("-")
+    return int(month) * 100 + int(day)
+
+
+def compile_rules(sheets: List[Timesheet]) -> Tuple[List[_Rule], bool]:
+    """Timesheets as rules, plus whether any were annotation-only. Raises ValueError if unsupported."""
+    rules = []
+    annotated = False
+    for sheet in sheets:
+        if sheet.day not in DAY_GROUPS and sheet.day not in WEEK and sheet.day not in ("HOL", "BEF_HOL", "AFT_HOL"):
+            raise ValueError(f"Unsupported day {sheet.day!r}")
+        if sheet.day_til is not None and (sheet.day not in WEEK or sheet.day_til not in WEEK):
+            raise ValueError(f"Unsupported day range {sheet.day}-{sheet.day_til}")
+        if sheet.start_time is None and sheet.end_time is None:
+            if sheet.note is not None:
+                annotated = True
+                continue
+            start, end = 0, MINUTES_PER_DAY
+        elif sheet.start_time is None or sheet.end_time is None:
+            raise ValueError("Timesheet with only one of startTime/endTime")
+        else:
+            start, end = _minutes(sheet.start_time), _minutes(sheet.end_time)
+            if start >= MINUTES_PER_DAY or end > MINUTES_PER_DAY:
+                raise ValueError(f"Time out of range: {sheet.start_time}-{sheet.end_time}")
+        season = (_mmdd(sheet.start_date), _mmdd(sheet.end_date))
+        rules.append(_Rule(season, sheet.day, sheet.day_til, start, end, sheet.excluded))
+    return rules, annotated
+
+
+class _Calendar:
+    """Per-date arrays for 31 Dec of the previous year through 31 Dec of year."""
+
+    def __init__(self, year: int, holidays: Set[datetime.date]):
+        first = datetime.date(year - 1, 12, 31)
+        self.dates = [first + datetime.timedelta(days=n) for n in range((datetime.date(year, 12, 31) - first).days + 1)]
+        self.mmdd = np.array([date.month * 100 + date.day for date in self.dates], dtype=np.int16)
+        self.weekday = np.array([date.weekday() for date in self.dates], dtype=np.int8)
+        one_day = datetime.timedelta(days=1)
+        self.holiday = np.array([date in holidays for date in self.dates])
+        self.before_holiday = np.array([date + one_day in holidays for date in self.dates])
+        self.after_holiday = np.array([date - one_day in holidays for date in self.dates])
+
+    def applies(self, rule: _Rule) -> np.ndarray:
+        start, end = rule.season
+        if start <= end:
+            days = (self.mmdd >= start) & (self.mmdd <= end)
+        else:
+            days = (self.mmdd >= start) | (self.mmdd <= end)
+        if rule.day == "HOL":
+            return days & self.holiday
+        if rule.day == "BEF_HOL":
+            return days & self.before_holiday
+        if rule.day == "AFT_HOL":
+            return days & self.after_holiday
+        if rule.day_til is not None:
+            first, last = WEEK.index(rule.day), WEEK.index(rule.day_til)
+            weekdays = [(first + n) % 7 for n in range((last - first) % 7 + 1)]
+        else:
+            weekdays = [WEEK.index(day) for day in DAY_GROUPS.get(rule.day, [rule.day])]
+        return days & np.isin(self.weekday, weekdays)
+
+
+class ScheduleIndex:
+    def __init__(self, holidays: Iterable[datetime.date] = ()):
+        self.holidays: Set[datetime.date] = set(holidays)
+        self.service_ids: List[str] = []
+        self.annotated: Set[str] = set()
+        self.unsupported: Dict[str, str] = {}  # service id -> reason
+        self._rules: List[List[_Rule]] = []
+        self._pattern_ids: Dict[bytes, int] = {bytes(MINUTES_PER_DAY): 0}
+        self._patterns = np.zeros((1, MINUTES_PER_DAY), dtype=bool)
+        self._open_minutes = np.zeros((1, MINUTES_PER_DAY + 1), dtype=np.int16)
+        self._years: Dict[int, np.ndarray] = {}  # year -> [service, day of year] pattern ids
+        # Compiling a year grows the shared pattern tables; queries may run in several threads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, records: Iterable[Tuple[str, str]], holidays: Iterable[datetime.date] = ()) -> "ScheduleIndex":
+        """Index from (service id, aixm_xml) pairs, e.g. bulk_convert or job results."""
+        index = cls(holidays)
+        for service_id, aixm_xml in records:
+            index.add(service_id, aixm_xml)
+        return index
+
+    def add(self, service_id: str, aixm_xml: str):
+        try:
+            rules, annotated = compile_rules(read_timesheets(aixm_xml))
+        except ValueError as error:
+            self.unsupported[service_id] = str(error)
+            return
+        with self._lock:
+            if annotated:
+                self.annotated.add(service_id)
+            self.service_ids.append(service_id)
+            self._rules.append(rules)
+            self._years.clear()
+
+    def __len__(self) -> int:
+        return len(self.service_ids)
+
+    @property
+    def pattern_count(self) -> int:
+        return len(self._pattern_ids)
+
+    def _pattern(self, bitmap: np.ndarray) -> int:
+        key = bitmap.tobytes()
+        pattern_id = self._pattern_ids.get(key)
+        if pattern_id is None:
+            pattern_id = self._pattern_ids[key] = len(self._pattern_ids)
+            self._pending.append(bitmap)
+        return pattern_id
+
+    def _compile_service(self, rules: List[_Rule], calendar: _Calendar) -> np.ndarray:
+        # Days that see the same rules today and the same overnight spill from yesterday
+        # share a bitmap, so bitmaps are built per distinct signature, not per day
+        applies = [calendar.applies(rule) for rule in rules]
+        signature = np.zeros(len(calendar.dates), dtype=object if len(rules) > 31 else np.int64)
+        for position, (rule, days) in enumerate(zip(rules, applies)):
+            signature += days.astype(signature.dtype) << (2 * position)
+            if rule.overnight:
+                signature[1:] += days[:-1].astype(signature.dtype) << (2 * position + 1)
+        signatures, inverse = np.unique(signature[1:], return_inverse=True)
+        ids = np.empty(len(signatures), dtype=np.int32)
+        for slot, value in enumerate(signatures):
+            opened = np.zeros(MINUTES_PER_DAY, dtype=bool)
+            closed = np.zeros(MINUTES_PER_DAY, dtype=bool)
+            for position, rule in enumerate(rules):
+                target = closed if rule.excluded else opened
+                if (int(value) >> (2 * position)) & 1:
+                    target[rule.start:rule.end if not rule.overnight else MINUTES_PER_DAY] = True
+                if (int(value) >> (2 * position + 1)) & 1:
+                    target[:rule.end] = True
+            ids[slot] = self._pattern(opened & ~closed)
+        return ids[inverse]
+
+    def _year(self, year: int) -> np.ndarray:
+        day_ids = self._years.get(year)
+        if day_ids is not None:
+            return day_ids
+        with self._lock:
+            day_ids = self._years.get(year)
+            if day_ids is not None:
+                return day_ids  # compiled by another thread while this one waited
+            calendar = _Calendar(year, self.holidays)
+            self._pending: List[np.ndarray] = []
+            day_ids = np.zeros((len(self._rules), len(calendar.dates) - 1), dtype=np.int32)
+            for row, rules in enumerate(self._rules):
+                if rules:
+                    day_ids[row] = self._compile_service(rules, calendar)
+            if self._pending:
+                added = np.array(self._pending)
+                self._patterns = np.concatenate([self._patterns, added])
+                counts = np.zeros((len(added), MINUTES_PER_DAY + 1), dtype=np.int16)
+                np.cumsum(added, axis=1, out=counts[:, 1:])
+                self._open_minutes = np.concatenate([self._open_minutes, counts])
+            self._years[year] = day_ids
+        return day_ids
+
+    def compile(self, years: Iterable[int]):
+        """Builds the per-day tables for years up front instead of on first query."""
+        for year in years:
+            self._year(year)
+
+    def open_at(self, when: datetime.datetime) -> np.ndarray:
+        """Boolean array over service_ids: open at the UTC instant when."""
+        when = _utc(when)
+        day_ids = self._year(when.year)[:, when.timetuple().tm_yday - 1]
+        return self._patterns[day_ids, when.hour * 60 + when.minute]
+
+    def open_minutes(self, start: datetime.datetime, end: datetime.datetime) -> np.ndarray:
+        """Open minutes per service in [start, end), at minute resolution."""
+        start, end = _utc(start).replace(second=0, microsecond=0), _utc(end).replace(second=0, microsecond=0)
+        totals = np.zeros(len(self._rules), dtype=np.int64)
+        day = start.date()
+        while day <= end.date():
+            first = (start.hour * 60 + start.minute) if day == start.date() else 0
+            last = (end.hour * 60 + end.minute) if day == end.date() else MINUTES_PER_DAY
+            if last > first:
+                day_ids = self._year(day.year)[:, day.timetuple().tm_yday - 1]
+                totals += self._open_minutes[day_ids, last].astype(np.int64) - self._open_minutes[day_ids, first]
+            day += datetime.timedelta(days=1)
+        return totals
+
+    def open_between(self, start: datetime.datetime, end: datetime.datetime, mode: str = "any") -> np.ndarray:
+        """Open at some point in [start, end) (mode "any") or throughout it ("all")."""
+        if mode not in WINDOW_MODES:
+            raise ValueError(f"mode must be one of {WINDOW_MODES}")
+        minutes = self.open_minutes(start, end)
+        if mode == "any":
+            return minutes > 0
+        window = int((_utc(end).replace(second=0, microsecond=0) - _utc(start).replace(second=0, microsecond=0)).total_seconds() // 60)
+        return minutes >= window
+
+    def services(self, mask: np.ndarray) -> List[str]:
+        return [self.service_ids[position] for position in np.flatnonzero(mask)]
+
+
+def _utc(when: datetime.datetime) -> datetime.datetime:
+    # Naive datetimes are taken as UTC, like the timesheets themselves
+    if when.tzinfo is None:
+        return when
+    return when.astimezone(datetime.timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,298 @@
+"""
+Deterministic parser for the common AIP schedule grammar described in prompt_template.
+
+parse_schedule() returns the timesheets for inputs it fully understands and None for
+anything incomplete or ambiguous, in which case the caller falls back to the LLM.
+"""
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+from .aixm_xml import DEFAULT_END_DATE, DEFAULT_START_DATE, Timesheet, render_time_intervals
+
+WEEK = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+MONTH_DAYS = [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+SUMMER = ("01-04", "31-10")
+WINTER = ("01-11", "31-03")
+YEAR_ROUND = (DEFAULT_START_DATE, DEFAULT_END_DATE)
+
+# Whole-range day groups the prompt maps to a single AIXM day code
+DAY_RANGE_CODES = {
+    ("MON", "FRI"): "WORK_DAY",
+    ("SAT", "SUN"): "WEEKEND",
+    ("MON", "SUN"): "ANY",
+}
+DAY_GROUP_CODES = {
+    "DAILY": "ANY",
+    "EVERY DAY": "ANY",
+    "WEEKDAYS": "WORK_DAY",
+    "WEEKENDS": "WEEKEND",
+}
+
+# Inputs that are nothing but a well-known annotation (no schedule of their own)
+ANNOTATION_ONLY = {"ATS SKED", "HO", "HX", "AD HR", "AD HRS", "NIL", "SEE NOTAM", "O/R"}
+
+TOKEN_RE = re.compile(
+    r"""
+    (?P<WS>\s+)
+  | (?P<H24>\bH24\b)
+  | (?P<DATE>\b\d{1,2}\s*(?:JAN|FEB|MAR|APR|MAY|JUN|JUL|AUG|SEP|OCT|NOV|DEC)[A-Z]*\b)
+  | (?P<TIME>\b\d{2}:?\d{2}\b)
+  | (?P<GROUP>\b(?:DAILY|EVERY\s+DAY|WEEKDAYS|WEEKENDS)\b)
+  | (?P<DAY>\b(?:MON|TUE|WED|THU|FRI|SAT|SUN)\b)
+  | (?P<HOL>\b(?:PUBLIC\s+)?(?:HOL|HOLIDAYS?)\b)
+  | (?P<SEASON>\b(?:SUM|SUMMER|WIN|WINTER)\b)
+  | (?P<DST>\b(?:SDLST|EDLST)\b)
+  | (?P<TREF>\(?\b(?:LT|LCL|LOCAL\s+TIME)\b\)?)
+  | (?P<EXCEPT>\b(?:EXCEPT|EXC|EXCL|EXCLUDING)\b)
+  | (?P<AND>\bAND\b)
+  | (?P<DASH>[-–—])
+  | (?P<SEP>[,;])
+  | (?P<COLON>:)
+  | (?P<PERIOD>\.)
+  | (?P<WORD>[^\s,;:.\-–—]+)
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+# Token kinds that must never show up inside trailing annotation text
+SCHEDULE_KINDS = {"H24", "DATE", "TIME", "GROUP", "DAY", "HOL", "SEASON", "DST", "TREF", "EXCEPT"}
+DAY_KINDS = {"DAY", "GROUP", "HOL"}
+
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+    pos: int
+
+
+class Ambiguous(Exception):
+    """Raised internally when the input leaves the supported grammar."""
+
+
+def tokenize(text: str) -> List[Token]:
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind != "WS":
+            tokens.append(Token(kind, match.group().upper(), match.start()))
+    return tokens
+
+
+def _time(value: str, start: bool = False) -> str:
+    digits = value.replace(":", "")
+    hours, minutes = int(digits[:2]), int(digits[2:])
+    # 24:00 only ends a slot (end of day); it can't start one
+    if hours > 24 or minutes > 59 or (hours == 24 and (minutes or start)):
+        raise Ambiguous(f"invalid time {value}")
+    return f"{digits[:2]}:{digits[2:]}"
+
+
+def _date(value: str) -> str:
+    match = re.match(r"(\d{1,2})\s*([A-Z]{3})", value)
+    day, month = int(match.group(1)), MONTHS.index(match.group(2)) + 1
+    if not 1 <= day <= MONTH_DAYS[month - 1]:
+        raise Ambiguous(f"invalid date {value}")
+    return f"{day:02d}-{month:02d}"
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.i = 0
+        self.blocks: List[Tuple[List[str], Tuple[str, str], List[Tuple[str, str]]]] = []
+        self.exclusions: List[Timesheet] = []
+        self.days: Optional[List[str]] = None
+        self.dates: Optional[Tuple[str, str]] = None
+        self.slots: List[Tuple[str, str]] = []
+        # Set when days/dates were given but no time slot has followed yet
+        self.days_pending = False
+        self.dates_pending = False
+        self.note: Optional[str] = None
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.i + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def kind(self, offset: int = 0) -> Optional[str]:
+        token = self.peek(offset)
+        return token.kind if token else None
+
+    def flush(self):
+        if self.slots:
+            self.blocks.append((self.days or ["ANY"], self.dates or YEAR_ROUND, self.slots))
+            self.slots = []
+
+    def parse(self) -> List[Timesheet]:
+        sentence_count = 0
+        sentence_start = 0
+        while self.i < len(self.tokens):
+            token = self.tokens[self.i]
+            if token.kind in DAY_KINDS:
+                self.select_days()
+            elif token.kind in ("SEASON", "DST", "DATE"):
+                self.select_dates()
+            elif token.kind == "EXCEPT":
+                self.exclude()
+            elif token.kind in ("TIME", "H24"):
+                self.add_slot()
+            elif token.kind == "TREF":
+                # Output is always tagged UTC; local-time schedules are left to the LLM
+                raise Ambiguous(f"time reference {token.value}")
+            elif token.kind == "PERIOD":
+                sentence_count += 1
+                sentence_start = self.i + 1
+                self.i += 1
+            elif token.kind == "WORD":
+                # Annotations either trail the first sentence or open a later one
+                if sentence_count and self.i != sentence_start:
+                    raise Ambiguous("annotation mixed into a later sentence")
+                self.annotate(token)
+                break
+            else:
+                self.i += 1
+
+        if self.days_pending or self.dates_pending:
+            raise Ambiguous("days or dates without a time slot")
+        self.flush()
+        if not self.blocks:
+            raise Ambiguous("no time slots found")
+
+        sheets = []
+        for days, (start_date, end_date), slots in self.blocks:
+            for day in days:
+                for start_time, end_time in slots:
+                    sheets.append(Timesheet(
+                        start_date=start_date,
+                        end_date=end_date,
+                        day=day,
+                        start_time=start_time,
+                        end_time=end_time,
+                        note=self.note,
+                    ))
+        return sheets + self.exclusions
+
+    def select_days(self):
+        if self.days_pending:
+            raise Ambiguous("consecutive day selections")
+        self.flush()
+        days: List[str] = []
+        while True:
+            token = self.peek()
+            if token.kind == "GROUP":
+                days.append(DAY_GROUP_CODES[" ".join(token.value.split())])
+                self.i += 1
+            elif token.kind == "HOL":
+                days.append("HOL")
+                self.i += 1
+            elif self.kind(1) == "DASH" and self.kind(2) == "DAY":
+                days.extend(self.day_range(token.value, self.peek(2).value))
+                self.i += 3
+            else:
+                days.append(token.value)
+                self.i += 1
+            if self.kind() in ("SEP", "AND") and self.kind(1) in DAY_KINDS:
+                self.i += 1
+            elif self.kind() not in DAY_KINDS:
+                break
+        if len(set(days)) != len(days):
+            raise Ambiguous("repeated day")
+        self.days = days
+        self.days_pending = True
+
+    @staticmethod
+    def day_range(first: str, last: str) -> List[str]:
+        if (first, last) in DAY_RANGE_CODES:
+            return [DAY_RANGE_CODES[(first, last)]]
+        start, end = WEEK.index(first), WEEK.index(last)
+        if start == end:
+            raise Ambiguous("empty day range")
+        return [WEEK[(start + n) % 7] for n in range((end - start) % 7 + 1)]
+
+    def select_dates(self):
+        if self.dates_pending:
+            raise Ambiguous("consecutive date selections")
+        token = self.peek()
+        if token.kind == "SEASON":
+            dates = SUMMER if token.value.startswith("SUM") else WINTER
+            self.i += 1
+        elif token.kind == "DST" and self.kind(1) == "DASH" and self.kind(2) == "DST":
+            pair = (token.value, self.peek(2).value)
+            if pair == ("SDLST", "EDLST"):
+                dates = SUMMER
+            elif pair == ("EDLST", "SDLST"):
+                dates = WINTER
+            else:
+                raise Ambiguous("unsupported DST range")
+            self.i += 3
+        elif token.kind == "DATE" and self.kind(1) == "DASH" and self.kind(2) == "DATE":
+            dates = (_date(token.value), _date(self.peek(2).value))
+            self.i += 3
+        else:
+            raise Ambiguous(f"unsupported date expression {token.value}")
+        self.flush()
+        self.dates = dates
+        self.dates_pending = True
+
+    def exclude(self):
+        self.i += 1
+        found = False
+        while self.kind() in ("HOL", "DATE"):
+            token = self.peek()
+            if token.kind == "HOL":
+                sheet = Timesheet(day="HOL", excluded=True)
+            else:
+                date = _date(token.value)
+                sheet = Timesheet(start_date=date, end_date=date, day="ANY", excluded=True)
+            if sheet not in self.exclusions:
+                self.exclusions.append(sheet)
+            found = True
+            self.i += 1
+            if self.kind() in ("SEP", "AND") and self.kind(1) in ("HOL", "DATE"):
+                self.i += 1
+        if not found:
+            raise Ambiguous("unsupported exclusion")
+
+    def add_slot(self):
+        token = self.peek()
+        if token.kind == "H24":
+            self.slots.append(("00:00", "24:00"))
+            self.i += 1
+        elif self.kind(1) == "DASH" and self.kind(2) == "TIME":
+            self.slots.append((_time(token.value, start=True), _time(self.peek(2).value)))
+            self.i += 3
+        else:
+            raise Ambiguous("time without a range")
+        self.days_pending = self.dates_pending = False
+
+    def annotate(self, token: Token):
+        if self.days_pending or self.dates_pending or not (self.slots or self.blocks):
+            raise Ambiguous("annotation before the schedule is complete")
+        note = self.text[token.pos:].strip()
+        if any(t.kind in SCHEDULE_KINDS for t in tokenize(note)):
+            raise Ambiguous("schedule terms inside annotation")
+        self.note = note
+        self.i = len(self.tokens)
+
+
+def parse_schedule(text: str) -> Optional[List[Timesheet]]:
+    """Parses standard AIP schedule text; returns None when the LLM should handle it."""
+    text = " ".join(text.split())
+    if not text:
+        return None
+    if text.upper().rstrip(".") in ANNOTATION_ONLY:
+        return [Timesheet(day="ANY", note=text)]
+    try:
+        return _Parser(text).parse()
+    except Ambiguous:
+        return None
+
+
+def convert_with_rules(text: str) -> Optional[str]:
+    """Returns the <aixm:timeInterval> XML for text, or None if it isn't fully understood."""
+    sheets = parse_schedule(text)
+    if sheets is None:
+        return None
+    return render_time_intervals(sheets)
@@ -0,0 +1,73 @@
+"""
+Singleflight-style coalescing of identical concurrent work.
+
+The first caller for a key starts the work as a task; callers arriving while it
+runs await the same task instead of starting their own, and all of them get its
+result or exception. Each waiter awaits through asyncio.shield, so a waiter that is
+cancelled (client gone, its own timeout) leaves without disturbing the others. When
+the last waiter leaves before the work finishes, the work is cancelled, since nobody
+is left to use the result.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Generic, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    def __init__(self, task: "asyncio.Task[T]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    def __init__(self):
+        self._flights: Dict[str, _Flight[T]] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Runs fn() unless a call for key is already in flight, in which case its result
+        is awaited instead. Returns (result, coalesced), where coalesced is True if
+        this caller joined an existing call.
+        """
+        flight = self._flights.get(key)
+        coalesced = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced with in-flight call ({flight.waiters} already waiting)")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), coalesced
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                logger.info("Last waiter left; cancelling in-flight call")
+                self.abandoned += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight[T]):
+        # A newer flight may already be registered under the same key
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "waiters": sum(flight.waiters for flight in self._flights.values()),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
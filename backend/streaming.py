@@ -0,0 +1,53 @@
+"""
+Helpers for /api/convert/stream: an incremental splitter that pulls finished
+<aixm:timeInterval> elements out of streamed model text, and SSE framing.
+"""
+import json
+import re
+from typing import Any, List
+
+INTERVAL_OPEN = "<aixm:timeInterval"
+INTERVAL_CLOSE = "</aixm:timeInterval>"
+INTERVAL_OPEN_RE = re.compile(r"<aixm:timeInterval[\s>]")
+
+
+class TimeIntervalSplitter:
+    """
+    Buffers streamed text and yields each complete <aixm:timeInterval> element as soon
+    as its closing tag arrives. Anything between elements (fences, XML declarations,
+    wrapper elements) is discarded, so elements come out ready for post-processing.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        self._buffer += chunk
+        elements = []
+        while True:
+            match = INTERVAL_OPEN_RE.search(self._buffer)
+            if match is None:
+                # Keep only a tail that could be the start of a split opening tag
+                self._buffer = self._buffer[-len(INTERVAL_OPEN):]
+                return elements
+            close = self._buffer.find(INTERVAL_CLOSE, match.start())
+            if close == -1:
+                self._buffer = self._buffer[match.start():]
+                return elements
+            end = close + len(INTERVAL_CLOSE)
+            elements.append(self._buffer[match.start():end])
+            self._buffer = self._buffer[end:]
+
+    @property
+    def pending(self) -> str:
+        """Unterminated text left over; non-empty at end of stream means truncated output."""
+        return self._buffer if INTERVAL_OPEN_RE.search(self._buffer) else ""
+
+
+def split_time_intervals(aixm_xml: str) -> List[str]:
+    """Splits an already complete fragment string into its timeInterval elements."""
+    return TimeIntervalSplitter().feed(aixm_xml)
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"